@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Exécution fonctionnelle par lots d'un même programme sur plusieurs jeux de données.
+
+Les registres et la mémoire de toutes les instances sont conservés dans des tableaux NumPy à deux
+dimensions (instance x registre, instance x mot). Chaque instruction est appliquée d'un seul coup
+à toutes les instances se trouvant au même PC; lorsque les branchements divergent, les instances
+sont regroupées par PC à chaque pas.
+
+Aucun modèle temporel (ROB, stations de réservation) n'est simulé: seul l'état architectural
+final est calculé. Celui-ci est le même que celui obtenu en lançant `Simulator` sur chaque
+instance séparément, à une limite près: les registres entiers sont des int64, alors que
+`Simulator` calcule sur des entiers Python. Une instance dont une addition, une soustraction ou
+une multiplication entière dépasse la capacité d'un int64 est arrêtée en erreur (voir `errors`)
+plutôt que de continuer avec un résultat tronqué; il faut alors la simuler avec `Simulator`.
+Exemple::
+
+    batch = BatchSimulator('../conf/fibo.xml', '../asm/fibo.mips', 1000)
+    batch.set_register('R2', numpy.arange(1000) % 40)
+    batch.go()
+    regs, mem = batch.get_state(42)
+
+Nécessite NumPy.
+'''
+
+import sys
+
+import numpy as np
+
+#local imports
+import interpreter as interp
+from interpreter import memory_re
+import components
+import simulator as sim
+
+
+#Plus petite valeur d'un registre entier.
+INT64_MIN = np.iinfo(np.int64).min
+
+
+#Enumération pour l'état de chaque instance
+class BatchState:
+    RUNNING, DONE, ERROR = range(0, 3)
+
+
+def int64_overflow(operator, a, b, value):
+    '''
+    Masque des résultats entiers `value` = `a` `operator` `b` ('+', '-' ou '*') qui ont dépassé
+     la capacité d'un int64 (et ont donc été tronqués).
+    '''
+    if operator == '+':
+        return ((a ^ value) & (b ^ value)) < 0
+    if operator == '-':
+        return ((a ^ b) & (a ^ value)) < 0
+    #Multiplication: sans dépassement, diviser le résultat par `b` redonne `a`.
+    with np.errstate(all='ignore'):
+        return (b != 0) & ((value // np.where(b == 0, 1, b) != a) |
+            ((a == INT64_MIN) & (b == -1)))
+
+
+class BatchSimulator(object):
+    '''
+    Exécute le programme `source_file` sur `n` instances initialisées avec `config_file`.
+    Les valeurs initiales propres à chaque instance sont ensuite assignées avec `set_register`
+     et `set_memory`.
+
+    `config_file` peut aussi être un objet `simulator.Configuration` et `source_file` une liste
+     d'instructions déjà décodées.
+
+    Si `record_branches` est vrai, le résultat de chaque branchement exécuté est conservé (voir
+     `branch_trace`).
+    '''
+    def __init__(self, config_file, source_file, n, record_branches=False):
+        if isinstance(config_file, sim.Configuration):
+            config = config_file
+        else:
+            config = sim.read_config(config_file)
+        if isinstance(source_file, list):
+            self.instructions = source_file
+        else:
+            self.instructions = interp.interpret_asm(source_file)
+        self.n = n
+
+        #État initial commun, construit avec les mêmes composantes que le simulateur.
+        regs = components.Registers(config.num_registers)
+        for name, value in config.registers:
+            regs[name] = value
+        mem = components.Memory(config.mem_size, config.mem_init_values)
+
+        self.num_registers = config.num_registers
+        self.R = np.tile(np.array([regs['R%i' % i] for i in range(self.num_registers)],
+            dtype=np.int64), (n, 1))
+        self.F = np.tile(np.array([regs['F%i' % i] for i in range(self.num_registers)],
+            dtype=np.float64), (n, 1))
+
+        #La mémoire du simulateur mélange entiers et flottants: on conserve les deux
+        #représentations et le type de chaque mot.
+        is_float = np.array([isinstance(v, float) for v in mem.data], dtype=bool)
+        self.mem_isf = np.tile(is_float, (n, 1))
+        self.mem_f = np.tile(np.array([v if isinstance(v, float) else 0.0 for v in mem.data],
+            dtype=np.float64), (n, 1))
+        self.mem_i = np.tile(np.array([v if not isinstance(v, float) else 0 for v in mem.data],
+            dtype=np.int64), (n, 1))
+        self.mem_size = len(mem.data)
+
+        self.PC = np.zeros(n, dtype=np.int64)
+        self.status = np.full(n, BatchState.RUNNING, dtype=np.int8)
+        if len(self.instructions) == 0:
+            self.status[:] = BatchState.DONE
+        #Nombre d'instructions exécutées par chaque instance
+        self.executed = np.zeros(n, dtype=np.int64)
+        #Message d'erreur de chaque instance en erreur
+        self.errors = {}
+        #Branchements exécutés, liste de tuples (instances, PC, pris)
+        self.branches = [] if record_branches else None
+
+    def set_register(self, name, values):
+        '''
+        Assigne la valeur initiale du registre `name` pour chaque instance. `values` est un
+         scalaire ou une séquence de longueur `n`.
+        '''
+        kind, k = self._register(name)
+        if name == 'R0':
+            raise Exception('Impossible d\'utiliser R0, ce registre est une constante.')
+        if kind == 'R':
+            self.R[:, k] = values
+        else:
+            self.F[:, k] = values
+
+    def set_memory(self, address, values):
+        '''
+        Assigne des valeurs initiales à la mémoire à partir de l'adresse (en octets) `address`.
+         `values` est de dimension (n,) ou (n, nombre de mots). Le type des mots (entier ou
+         flottant) est déterminé par le type du tableau.
+        '''
+        values = np.asarray(values)
+        if values.ndim < 2:
+            values = np.broadcast_to(values.reshape(-1, 1), (self.n, 1))
+        start = int(address / 8)
+        end = start + values.shape[1]
+        if address % 8 != 0 or start < 0 or end > self.mem_size:
+            raise Exception('Indexation invalide de la mémoire (%i).' % address)
+
+        if np.issubdtype(values.dtype, np.floating):
+            self.mem_f[:, start:end] = values
+            self.mem_isf[:, start:end] = True
+        else:
+            self.mem_i[:, start:end] = values
+            self.mem_isf[:, start:end] = False
+
+    def get_state(self, k):
+        '''
+        Retourne les registres (`components.Registers`) et la mémoire (`components.Memory`)
+         de l'instance `k`, dans le même format que ceux du simulateur.
+        '''
+        regs = components.Registers(self.num_registers)
+        for i in range(self.num_registers):
+            regs.__setitem__('R%i' % i, int(self.R[k, i]), bypass=True)
+            regs['F%i' % i] = float(self.F[k, i])
+
+        mem = components.Memory(0, [])
+        mem.data = [float(f) if isf else int(i)
+            for f, i, isf in zip(self.mem_f[k], self.mem_i[k], self.mem_isf[k])]
+        return regs, mem
+
+    def branch_trace(self, k=0):
+        '''
+        Retourne les branchements exécutés par l'instance `k` (voir `record_branches`), dans
+         l'ordre, sous forme de trois tableaux: adresses des branchements, destinations et
+         résultats (pris ou non).
+        '''
+        if self.branches is None:
+            raise Exception('Les branchements n\'ont pas été enregistrés (record_branches).')
+        pcs = []
+        taken = []
+        for idx, pc, group_taken in self.branches:
+            selected = np.flatnonzero(idx == k)
+            if len(selected) > 0:
+                pcs.append(pc)
+                taken.append(group_taken[selected[0]])
+        targets = [int(self.instructions[pc].operands[-1][1:]) for pc in pcs]
+        return (np.array(pcs, dtype=np.int32), np.array(targets, dtype=np.int32),
+            np.array(taken, dtype=bool))
+
+    def go(self, max_steps=None):
+        '''
+        Exécute toutes les instances jusqu'à la fin du programme (ou `max_steps` instructions).
+
+        Valeurs de retour:
+
+        * 0 = Toutes les instances se sont terminées avec succès
+        * 1 = Au moins une instance a rencontré une erreur (voir `self.errors`) ou n'a pas
+              terminé en `max_steps` instructions.
+        '''
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            active = np.flatnonzero(self.status == BatchState.RUNNING)
+            if len(active) == 0:
+                break
+
+            pcs = self.PC[active]
+            if (pcs == pcs[0]).all():
+                #Cas le plus fréquent: toutes les instances avancent ensemble.
+                self.execute(int(pcs[0]), active)
+            else:
+                #Regroupement des instances par PC
+                order = np.argsort(pcs, kind='stable')
+                bounds = np.flatnonzero(np.diff(pcs[order])) + 1
+                for group in np.split(active[order], bounds):
+                    self.execute(int(self.PC[group[0]]), group)
+            steps += 1
+
+        if (self.status == BatchState.DONE).all():
+            return 0
+        return 1
+
+    def execute(self, pc, idx):
+        '''
+        Exécute l'instruction `pc` pour les instances `idx` (qui doivent toutes être à ce PC).
+        '''
+        instr = self.instructions[pc]
+        self.executed[idx] += 1
+        next_pc = np.full(len(idx), pc + 1, dtype=np.int64)
+
+        if instr.funit_type == 'Branch':
+            #Même comportement que `Simulator.exec_instr`.
+            if instr.code == 'BEQ':
+                taken = self._read(instr.operands[0], idx) == self._read(instr.operands[1], idx)
+            elif instr.code == 'BNE':
+                taken = self._read(instr.operands[0], idx) != self._read(instr.operands[1], idx)
+            elif instr.code == 'BEQZ':
+                #Le simulateur compare vk, qui n'est jamais assigné pour un BEQZ: le branchement
+                #n'est donc jamais pris.
+                taken = np.zeros(len(idx), dtype=bool)
+            elif instr.code == 'BNEZ':
+                taken = self._read(instr.operands[0], idx) != 0
+            elif instr.code == 'J':
+                taken = np.ones(len(idx), dtype=bool)
+            else:
+                raise Exception('Instruction de branchement inconnue (%s).' % (instr.code))
+            taken = np.broadcast_to(taken, (len(idx),))
+            next_pc[taken] = int(instr.operands[-1][1:])
+            if self.branches is not None:
+                self.branches.append((idx.copy(), pc, taken.copy()))
+        elif instr.funit_type == 'Load':
+            if instr.code == 'LD':
+                want_float = False
+            elif instr.code == 'L.D':
+                want_float = True
+            else:
+                raise Exception('Instruction Load inconnue (%s).' % (instr.code))
+            i, ok = self._word_index(instr.operands[1], idx)
+            isf = self.mem_isf[idx, i]
+            mismatch = ok & (isf != want_float)
+            self._fail(idx[mismatch], "Incompatibilité pour %s. On lance une exception plutôt \
+que d'interpréter incorrectement une variable, ce qui produirait des bugs plus difficiles à \
+tracer." % instr.code)
+            ok &= ~mismatch
+            if want_float:
+                value = self.mem_f[idx, i]
+            else:
+                value = self.mem_i[idx, i]
+            ok = self._write_masked(instr.operands[0], idx, value, ok)
+            next_pc = next_pc[ok]
+            idx = idx[ok]
+        elif instr.funit_type == 'Store':
+            value = np.broadcast_to(self._read(instr.operands[0], idx), (len(idx),))
+            i, ok = self._word_index(instr.operands[1], idx)
+            idx, i, value, next_pc = idx[ok], i[ok], value[ok], next_pc[ok]
+            if np.issubdtype(value.dtype, np.floating):
+                self.mem_f[idx, i] = value
+                self.mem_isf[idx, i] = True
+            else:
+                self.mem_i[idx, i] = value
+                self.mem_isf[idx, i] = False
+        else:
+            a = self._read(instr.operands[1], idx)
+            b = self._read(instr.operands[2], idx)
+            ok = np.ones(len(idx), dtype=bool)
+            if instr.operator == '+':
+                value = a + b
+            elif instr.operator == '-':
+                value = a - b
+            elif instr.operator == '*':
+                value = a * b
+            elif instr.operator == '/':
+                #Division réelle, comme `eval` en Python 3.
+                ok = np.broadcast_to(b != 0, (len(idx),)).copy()
+                self._fail(idx[~ok], 'Division par zéro.')
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    value = np.true_divide(a, b)
+            elif instr.operator == '&':
+                #Le & n'est défini que pour les entiers.
+                if instr.operands[1][0] == 'F' or instr.operands[2][0] == 'F':
+                    ok[:] = False
+                    self._fail(idx, 'Opérande invalide pour &.')
+                    value = a
+                else:
+                    value = np.bitwise_and(a, b)
+            else:
+                raise Exception('Opérateur inconnu (%s).' % instr.operator)
+            if instr.operator in ['+', '-', '*'] and np.asarray(value).dtype == np.int64:
+                overflow = np.broadcast_to(int64_overflow(instr.operator, a, b, value),
+                    (len(idx),))
+                ok &= ~overflow
+                self._fail(idx[overflow], 'Dépassement de capacité des entiers 64 bits, '
+                    'utiliser Simulator pour cette instance.')
+            value = np.broadcast_to(value, (len(idx),))
+            ok = self._write_masked(instr.operands[0], idx, value, ok)
+            next_pc = next_pc[ok]
+            idx = idx[ok]
+
+        self.PC[idx] = next_pc
+        self.status[idx[next_pc >= len(self.instructions)]] = BatchState.DONE
+
+    def _register(self, name):
+        '''Valide un nom de registre et retourne son type ('R' ou 'F') et son indice.'''
+        if name[0] not in ['R', 'F'] or int(name[1:]) not in range(0, self.num_registers):
+            raise Exception('Accès à un registre non valide: %s.' % name)
+        return name[0], int(name[1:])
+
+    def _read(self, operand, idx):
+        '''Lit une opérande (registre ou valeur immédiate) pour les instances `idx`.'''
+        if operand[0] == '#':
+            return int(operand[1:])
+        kind, k = self._register(operand)
+        if kind == 'R':
+            return self.R[idx, k]
+        return self.F[idx, k]
+
+    def _write(self, dest, idx, value):
+        '''
+        Écrit `value` dans le registre `dest` des instances `idx` avec la même conversion que
+         `components.Registers`. Retourne un masque des écritures réussies.
+        '''
+        kind, k = self._register(dest)
+        ok = np.ones(len(idx), dtype=bool)
+        if dest == 'R0':
+            self._fail(idx, 'Impossible d\'utiliser R0, ce registre est une constante.')
+            ok[:] = False
+        elif kind == 'R':
+            if np.issubdtype(value.dtype, np.floating):
+                ok = np.isfinite(value)
+                self._fail(idx[~ok], 'Valeur à assigner invalide.')
+                value = np.trunc(np.where(ok, value, 0)).astype(np.int64)
+            self.R[idx[ok], k] = value[ok]
+        else:
+            self.F[idx, k] = value
+        return ok
+
+    def _write_masked(self, dest, idx, value, ok):
+        '''
+        Écrit `value` dans `dest` pour les instances `idx` sélectionnées par le masque `ok`.
+         Retourne le masque mis à jour avec les écritures ayant échoué.
+        '''
+        ok = ok.copy()
+        if ok.any():
+            selected = np.flatnonzero(ok)
+            ok[selected[~self._write(dest, idx[selected], value[selected])]] = False
+        return ok
+
+    def _word_index(self, operand, idx):
+        '''
+        Calcule l'indice du mot accédé par une opérande mémoire de la forme IMM(RX) pour les
+         instances `idx`. Retourne les indices et un masque des accès valides, avec les mêmes
+         vérifications que `components.Memory`.
+        '''
+        if memory_re.match(operand) is None:
+            raise Exception('Opérande invalide.')
+        reg_name = operand.split('(')[1].split(')')[0]
+        imm = int(operand.split('(')[0])
+        address = np.broadcast_to(self._read(reg_name, idx) + imm, (len(idx),))
+
+        word = address / 8.0
+        i = np.trunc(word).astype(np.int64)
+        ok = ~(np.abs(i - word) > 1e-4) & (i >= -self.mem_size) & (i < self.mem_size)
+        self._fail(idx[~ok], 'Indexation invalide de la mémoire, doit être un multiple de 8.')
+        #Indices négatifs: même comportement qu'une liste Python.
+        i = np.where(ok, i % self.mem_size, 0)
+        return i, ok
+
+    def _fail(self, idx, message):
+        '''Arrête les instances `idx` en erreur.'''
+        for k in idx:
+            self.errors[int(k)] = message
+        self.status[idx] = BatchState.ERROR
+
+
+if __name__ == '__main__':
+    sys.stderr.write('Ce module n\'est pas utilisable seul.')
+    sys.exit(-1)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Évaluation rapide de prédicteurs de branchement par rejeu d'une trace de branchements.
+
+La commande `record` exécute le programme une seule fois, de façon fonctionnelle (voir
+ `batch.py`), et enregistre pour chaque branchement exécuté son adresse, sa destination et son
+ résultat. La commande `replay` fait ensuite passer cette trace dans autant de prédicteurs
+ (unités compatibles avec `components.BranchUnit`) que voulu, en parallèle, et affiche leur
+ précision et leur nombre d'erreurs par millier d'instructions (MPKI):
+
+    python branch_replay.py record ../conf/fibo.xml ../asm/fibo.mips -o fibo.npz
+    python branch_replay.py replay fibo.npz -p GshareBranchUnit,table_bits=10 \\
+        -p TageBranchUnit -p BranchUnit,forward_branch=nottaken,backward_branch=taken
+
+Contrairement au simulateur, où la prédiction est faite au lancement et le prédicteur mis à
+ jour à l'exécution du branchement, chaque prédiction est ici immédiatement suivie de la mise à
+ jour: les résultats sont ceux d'un prédicteur sans spéculation.
+
+Nécessite NumPy.
+'''
+
+import argparse
+import multiprocessing
+import sys
+
+import numpy as np
+
+#local imports
+import batch
+import simulator as sim
+
+#Trace chargée par chaque processus (voir `init_worker`).
+_trace = None
+
+
+def record(config_file, source_file, output_file, max_steps=None):
+    '''
+    Exécute `source_file` et enregistre ses branchements dans `output_file` (format .npz).
+     Retourne le nombre de branchements et d'instructions exécutés.
+    '''
+    engine = batch.BatchSimulator(config_file, source_file, 1, record_branches=True)
+    if engine.go(max_steps) != 0:
+        raise Exception('Exécution incomplète: %s' % engine.errors.get(0,
+            'nombre maximal d\'instructions atteint.'))
+    pcs, targets, taken = engine.branch_trace()
+    instructions = int(engine.executed[0])
+    np.savez_compressed(output_file, pc=pcs, target=targets, taken=taken,
+        instructions=instructions)
+    return len(pcs), instructions
+
+
+def load_trace(trace_file):
+    '''Retourne la trace `trace_file`: adresses, destinations, résultats et instructions.'''
+    with np.load(trace_file) as data:
+        return (data['pc'].tolist(), data['target'].tolist(), data['taken'].tolist(),
+            int(data['instructions']))
+
+
+def parse_predictor(text):
+    '''
+    Décode une description de prédicteur de la forme 'Classe,paramètre=valeur,...' en un
+     tuple (description, paramètres de la balise <Branch>).
+    '''
+    items = text.split(',')
+    params = {'class': items[0].strip(), 'number': '1', 'latency': '1'}
+    k = None
+    for item in items[1:]:
+        if '=' in item:
+            k, v = item.split('=', 1)
+            k = k.strip()
+            params[k] = v.strip()
+        elif k is not None:
+            #Valeur contenant elle-même des virgules, e.g. history_lengths=4,8,16
+            params[k] += ',' + item.strip()
+        else:
+            raise argparse.ArgumentTypeError('Prédicteur invalide: %s (format attendu: '
+                'Classe,paramètre=valeur,...).' % text)
+    return text, params
+
+
+def replay(params, trace):
+    '''
+    Fait passer la trace `trace` (voir `load_trace`) dans un prédicteur construit avec les
+     paramètres `params`. Retourne le nombre de mauvaises prédictions.
+    '''
+    unit = sim.build_functional_units('Branch', params)[0]
+    get_prediction = unit.get_prediction
+    update = unit.update
+    mispredictions = 0
+    pcs, targets, taken, _ = trace
+    for pc, target, t in zip(pcs, targets, taken):
+        if get_prediction(pc, target) != t:
+            mispredictions += 1
+        update(t)
+    return mispredictions
+
+
+def init_worker(trace_file):
+    global _trace
+    _trace = load_trace(trace_file)
+
+
+def replay_job(job):
+    '''Évalue un prédicteur sur la trace du processus. Retourne (description, erreurs).'''
+    description, params = job
+    try:
+        return description, replay(params, _trace)
+    except Exception as e:
+        sys.stderr.write('%s: %s\n' % (description, e))
+        return description, None
+
+
+def main_record(config_file, source_file, output_file, max_steps):
+    branches, instructions = record(config_file, source_file, output_file, max_steps)
+    print('%i branchements (%i instructions) enregistrés dans %s.' % (branches, instructions,
+        output_file))
+    return 0
+
+
+def main_replay(trace_file, predictors, processes):
+    pcs, _, taken, instructions = load_trace(trace_file)
+    branches = len(pcs)
+    print('%i branchements (%i pris), %i instructions.' % (branches, sum(taken),
+        instructions))
+
+    pool = multiprocessing.Pool(processes, initializer=init_worker, initargs=(trace_file,))
+    try:
+        results = pool.map(replay_job, predictors)
+        pool.close()
+    finally:
+        pool.join()
+
+    err = 0
+    width = max(len(d) for d, _ in predictors)
+    for description, mispredictions in results:
+        if mispredictions is None:
+            err = 1
+            continue
+        accuracy = 100. * (branches - mispredictions) / branches if branches else 100.
+        mpki = 1000. * mispredictions / instructions if instructions else 0.
+        print('%-*s  précision %6.2f%%  %8i erreurs  MPKI %7.2f' % (width, description,
+            accuracy, mispredictions, mpki))
+    return err
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Enregistre les branchements d\'un programme \
+puis évalue des prédicteurs de branchement sur cette trace.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    record_parser = subparsers.add_parser('record', help='Enregistre la trace de branchements \
+d\'un programme.')
+    record_parser.add_argument('config_file', help='Fichier xml de configuration.')
+    record_parser.add_argument('source_file', help='Fichier contenant le code source.')
+    record_parser.add_argument('-o', dest='output_file', default='branches.npz',
+        help='Fichier de trace (.npz).')
+    record_parser.add_argument('--max-instr', type=int, default=None, dest='max_steps',
+        help="Nombre maximal d'instructions exécutées.")
+
+    replay_parser = subparsers.add_parser('replay', help='Évalue des prédicteurs sur une \
+trace de branchements.')
+    replay_parser.add_argument('trace_file', help='Fichier de trace (.npz).')
+    replay_parser.add_argument('-p', dest='predictors', action='append', required=True,
+        type=parse_predictor, help='Prédicteur à évaluer, e.g. \
+GshareBranchUnit,table_bits=10. Peut être répété.')
+    replay_parser.add_argument('-j', dest='processes', type=int, default=None,
+        help='Nombre de processus (par défaut, le nombre de processeurs).')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        sys.exit(main_record(args.config_file, args.source_file, args.output_file,
+            args.max_steps))
+    else:
+        sys.exit(main_replay(args.trace_file, args.predictors, args.processes))
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Modèle temporel d'une hiérarchie de caches associatifs par ensembles placée devant la mémoire.
+
+Seules les étiquettes sont simulées: les données restent dans `components.Memory`. Le cache
+ ne sert qu'à déterminer la latence de chaque accès des unités Load et Store, et à compter les
+ succès et les échecs de chaque niveau. Les caches sont inclusifs, à écriture avec allocation;
+ les réécritures des lignes modifiées ne sont pas modélisées.
+
+Exemple de configuration (tailles en octets):
+
+    <Cache memory_latency="100">
+        <L1 size="1024" assoc="2" line_size="32" latency="2" replacement="lru"/>
+        <L2 size="16384" assoc="8" line_size="64" latency="10" replacement="plru"/>
+    </Cache>
+'''
+
+import sys
+from array import array
+
+#Paramètres des niveaux de cache et valeurs par défaut.
+level_defaults = {'size': 1024, 'assoc': 2, 'line_size': 32, 'latency': 1,
+    'replacement': 'lru'}
+#Politiques de remplacement.
+replacement_policies = ['lru', 'plru']
+#Latence par défaut d'un accès manquant tous les niveaux.
+MEMORY_LATENCY = 100
+
+
+class CacheLevel(object):
+    '''
+    Un niveau de cache de `size` octets, associatif à `assoc` voies, avec des lignes de
+     `line_size` octets. Un succès coûte `latency` coups d'horloge.
+
+    Les étiquettes sont conservées dans un tableau d'entiers de `ensembles * assoc` cases (-1
+     pour une ligne invalide). Le remplacement est LRU (date du dernier accès de chaque ligne)
+     ou pseudo-LRU (arbre de `assoc - 1` bits par ensemble).
+    '''
+    def __init__(self, name, size, assoc, line_size, latency, replacement='lru'):
+        self.name = name
+        self.size = int(size)
+        self.assoc = int(assoc)
+        self.line_size = int(line_size)
+        self.latency = int(latency)
+        self.replacement = replacement
+        if replacement not in replacement_policies:
+            raise Exception('Politique de remplacement inconnue pour %s: %s (choix: %s).' %
+                (name, replacement, ', '.join(replacement_policies)))
+        if self.assoc < 1 or self.line_size < 1 or self.size % (self.line_size * self.assoc) \
+          != 0 or self.size < self.line_size * self.assoc:
+            raise Exception('Géométrie invalide pour %s: la taille doit être un multiple de '
+                'line_size * assoc.' % name)
+        if replacement == 'plru' and self.assoc & (self.assoc - 1) != 0:
+            raise Exception('Le remplacement pseudo-LRU de %s demande une associativité '
+                'puissance de 2.' % name)
+        self.sets = self.size // (self.line_size * self.assoc)
+        self.reset()
+
+    def reset(self):
+        '''Invalide toutes les lignes et remet les statistiques à zéro.'''
+        self.tags = array('q', [-1]) * (self.sets * self.assoc)
+        if self.replacement == 'lru':
+            self.stamps = array('q', [0]) * (self.sets * self.assoc)
+            self.clock = 0
+        else:
+            self.tree = array('B', [0]) * (self.sets * max(self.assoc - 1, 1))
+        self.hits = 0
+        self.misses = 0
+
+    def access(self, addr):
+        '''
+        Accède à l'adresse (en octets) `addr`. Retourne True si c'est un succès; sinon, la
+         ligne est chargée à la place de la victime choisie par la politique de remplacement.
+        '''
+        line = addr // self.line_size
+        s = line % self.sets
+        tag = line // self.sets
+        base = s * self.assoc
+        tags = self.tags
+
+        for way in range(self.assoc):
+            if tags[base + way] == tag:
+                self.hits += 1
+                self.touch(s, way)
+                return True
+
+        self.misses += 1
+        way = self.victim(s)
+        tags[base + way] = tag
+        self.touch(s, way)
+        return False
+
+    def touch(self, s, way):
+        '''Met à jour l'information de remplacement après un accès à `way` de l'ensemble `s`.'''
+        if self.replacement == 'lru':
+            self.clock += 1
+            self.stamps[s * self.assoc + way] = self.clock
+        else:
+            #Chaque bit de l'arbre pointe vers la moitié à remplacer: on l'éloigne de `way`.
+            base = s * (self.assoc - 1)
+            node = 0
+            bit = self.assoc >> 1
+            while bit:
+                go_right = 1 if way & bit else 0
+                self.tree[base + node] = 1 - go_right
+                node = 2 * node + 1 + go_right
+                bit >>= 1
+
+    def victim(self, s):
+        '''Voie à remplacer dans l'ensemble `s` (une ligne invalide s'il y en a une).'''
+        base = s * self.assoc
+        for way in range(self.assoc):
+            if self.tags[base + way] == -1:
+                return way
+        if self.replacement == 'lru':
+            stamps = self.stamps[base:base + self.assoc]
+            return stamps.index(min(stamps))
+        tree_base = s * (self.assoc - 1)
+        node = 0
+        way = 0
+        bit = self.assoc >> 1
+        while bit:
+            go_right = self.tree[tree_base + node]
+            if go_right:
+                way |= bit
+            node = 2 * node + 1 + go_right
+            bit >>= 1
+        return way
+
+    def __repr__(self):
+        return '%s: %i octets, %i voies, lignes de %i octets, %s' % (self.name, self.size,
+            self.assoc, self.line_size, self.replacement.upper())
+
+
+class CacheHierarchy(object):
+    '''
+    Niveaux de cache (`CacheLevel`) consultés dans l'ordre. La latence d'un accès est celle du
+     premier niveau qui contient la ligne, ou `memory_latency` si aucun ne la contient. La ligne
+     est alors chargée dans tous les niveaux consultés.
+    '''
+    def __init__(self, levels, memory_latency=MEMORY_LATENCY):
+        self.levels = levels
+        self.memory_latency = int(memory_latency)
+
+    def reset(self):
+        for level in self.levels:
+            level.reset()
+
+    def access(self, addr):
+        '''Accède à l'adresse `addr` et retourne la latence de l'accès.'''
+        for level in self.levels:
+            if level.access(addr):
+                return level.latency
+        return self.memory_latency
+
+    def stats(self):
+        '''Liste de tuples (niveau, accès, succès, échecs).'''
+        return [(l.name, l.hits + l.misses, l.hits, l.misses) for l in self.levels]
+
+    def report(self):
+        '''Description des statistiques de chaque niveau.'''
+        lines = []
+        for name, accesses, hits, misses in self.stats():
+            rate = 100. * hits / accesses if accesses else 0.
+            lines.append('Cache %s: %i accès, %i succès (%.2f%%), %i échecs.' % (name,
+                accesses, hits, rate, misses))
+        return '\n'.join(lines)
+
+
+def create_hierarchy(levels, memory_latency=MEMORY_LATENCY):
+    '''
+    Construit une hiérarchie à partir de `levels`, OrderedDict associant le nom de chaque
+     niveau à ses paramètres (chaînes de caractères, voir `level_defaults`).
+    '''
+    caches = []
+    for name, params in levels.items():
+        for k in params:
+            if k not in level_defaults:
+                raise Exception('Paramètre de cache inconnu pour %s: %s (choix: %s).' % (name,
+                    k, ', '.join(sorted(level_defaults))))
+        p = dict(level_defaults)
+        p.update(params)
+        caches.append(CacheLevel(name, p['size'], p['assoc'], p['line_size'], p['latency'],
+            p['replacement']))
+    return CacheHierarchy(caches, memory_latency)
+
+
+if __name__ == '__main__':
+    sys.stderr.write('Ce module n\'est pas utilisable seul.')
+    sys.exit(-1)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Arguments de la ligne de commande du simulateur, partagés par `mipssim.py` et `client.py`.
+'''
+
+import argparse
+
+
+def make_parser():
+    '''Analyseur des arguments de la ligne de commande.'''
+    parser = argparse.ArgumentParser(description='Simulateur de MIPS en Python (2.7+). Testé avec\
+ Python 2.7 et 3.3.', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('config_file', help="Fichier xml contenant la configuration du simulateur.")
+    parser.add_argument('source_file', help="Fichier contenant le code source à exécuter.")
+    parser.add_argument('trace_file', nargs='?', help="Ficher dans lequel sera écrit \
+l'état du simulateur à tous les pas de temps.")
+    parser.add_argument('-L', dest='latex_trace_file', help="Fichier pour écrire une trace sous \
+format LaTeX (surtout les tableaux).")
+    parser.add_argument('-d', default=False, action='store_true', dest='debug', help="Force \
+l'impression de davantage d'information à chaque étape de l'exécution dans la ligne de commande.")
+
+    parser.add_argument('--max-cycles', type=int, default=None, help="Nombre maximal de coups \
+d'horloge (code de retour 3 si atteint).")
+    parser.add_argument('--max-instr', type=int, default=None, dest='max_instructions',
+        help="Nombre maximal d'instructions sanctionnées (code de retour 4 si atteint).")
+    parser.add_argument('--timeout', type=float, default=None, dest='max_time', help="Temps \
+d'exécution maximal en secondes (code de retour 5 si atteint).")
+    parser.add_argument('--detect-loops', default=False, action='store_true', help="Détecte \
+les boucles infinies en comparant l'état architectural à chaque branchement arrière (code de \
+retour 6).")
+    parser.add_argument('--stall-limit', type=int, default=None, help="Arrête la simulation \
+et affiche l'état du ROB, des stations de réservation et des registres si aucune instruction \
+n'est lancée, écrite ou sanctionnée pendant ce nombre de coups d'horloge (code de retour 7).")
+
+    parser.add_argument('--mem-dump', choices=['full', 'modified', 'digest', 'none'],
+        default=None, help="Affichage de la mémoire: tout son contenu au début et à la fin, \
+seulement les mots modifiés par le programme, seulement une empreinte (SHA-1) ou rien. Par \
+défaut, tout son contenu, sauf pour une mémoire creuse ou de plus de 2^20 mots (mots \
+modifiés). Une mémoire creuse n'est jamais affichée en entier.")
+    parser.add_argument('--mem-range', action='append', type=parse_range, default=[],
+        dest='mem_ranges', help="Affiche les mots d'adresses comprises dans l'intervalle \
+DEBUT:FIN (en octets, FIN exclue) au début et à la fin. Peut être répété.")
+    parser.add_argument('--mem-file', default=None, help="Écrit le contenu final de la mémoire \
+dans ce fichier, sous forme de tableau NumPy si son nom se termine par .npy (NumPy requis), \
+sinon en binaire (8 octets par mot puis 1 octet de type par mot).")
+
+    return parser
+
+
+def parse_range(text):
+    '''Décode un intervalle d'adresses 'DEBUT:FIN' en un tuple (DEBUT, FIN).'''
+    try:
+        start, end = text.split(':')
+        return int(start, 0), int(end, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError('Intervalle invalide: %s (format attendu: '
+            'DEBUT:FIN).' % text)
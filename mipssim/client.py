@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Client du serveur de simulations (`server.py`). S'utilise exactement comme `mipssim.py`, mais la
+ simulation est exécutée par un processus du serveur, déjà démarré.
+'''
+
+import json
+import os
+import socket
+import sys
+import tempfile
+
+#local imports
+from cli import make_parser
+
+default_socket = os.path.join(tempfile.gettempdir(), 'mipssim-%i.sock' % os.getuid())
+#Code de retour d'une erreur non prévue, comme `simulator.ExitCode.UNEXPECTED_ERROR`.
+UNEXPECTED_ERROR = 2
+
+
+def submit(args, socket_path=None, port=None):
+    '''
+    Soumet une simulation au serveur et retourne son code de retour et ce qu'elle a affiché.
+    '''
+    if port is not None:
+        conn = socket.create_connection(('127.0.0.1', port))
+    else:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(socket_path)
+
+    #Le serveur n'a pas nécessairement le même répertoire courant.
+    for k in ['config_file', 'source_file', 'trace_file', 'latex_trace_file', 'mem_file']:
+        if args.get(k):
+            args[k] = os.path.abspath(args[k])
+
+    with conn:
+        conn.sendall(json.dumps({'id': 0, 'args': args}).encode() + b'\n')
+        conn.shutdown(socket.SHUT_WR)
+        with conn.makefile('rb') as f:
+            line = f.readline()
+
+    if not line:
+        raise Exception('Le serveur a fermé la connexion sans répondre.')
+    try:
+        response = json.loads(line.decode())
+        return response['exit_code'], response['output']
+    except (ValueError, KeyError, TypeError):
+        raise Exception('Réponse invalide du serveur: %s' % line.decode(errors='replace'))
+
+
+if __name__ == '__main__':
+    parser = make_parser()
+    parser.add_argument('--socket', dest='socket_path', default=default_socket,
+        help='Socket Unix du serveur.')
+    parser.add_argument('--port', type=int, default=None, help='Port TCP du serveur, plutôt \
+qu\'un socket Unix.')
+
+    args = vars(parser.parse_args())
+    socket_path = args.pop('socket_path')
+    port = args.pop('port')
+
+    try:
+        err, output = submit(args, socket_path, port)
+    except Exception as e:
+        sys.stderr.write('%s\n' % e)
+        sys.exit(UNEXPECTED_ERROR)
+    sys.stdout.write(output)
+    sys.exit(err)
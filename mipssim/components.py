@@ -7,13 +7,17 @@
 #  the top-level directory of this project and at
 #  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
 
-
-from collections import OrderedDict, namedtuple
+import hashlib
+import itertools
+from array import array
+from collections import OrderedDict, deque, namedtuple
 
 #16 registres c'est suffisant pour les exemples nous intéressant.
 #Normalement, c'est 32, mais ça ne fait que réduire la lisibilité des
-#traces.
+#traces. Valeur par défaut, voir <Core registers="..."> dans la configuration.
 NUM_REGISTERS = 16
+#Taille par défaut du ROB, voir <Core rob_size="...">.
+ROB_SIZE = 24
 
 '''Instruction: tuple nommé contenant les champs importants représentant une instruction.
 Paramètres:
@@ -30,11 +34,37 @@ class State:
         UNUSED, ISSUE, EXECUTE, WRITE, COMMIT = range(0,5)
 
 
+class ProgramError(Exception):
+    '''
+    Erreur commise par le programme simulé (e.g. accès mémoire invalide), par opposition à une
+     erreur du simulateur. Voir `simulator.ExitCode.PROGRAM_ERROR`.
+    '''
+
+
+def fields(obj):
+    '''
+    Retourne un dictionnaire ordonné des champs de `obj`: ceux déclarés dans les `__slots__`
+     de sa classe et de ses classes de base, puis ceux de son `__dict__` s'il en a un.
+    '''
+    result = OrderedDict()
+    for cl in reversed(type(obj).__mro__):
+        for name in cl.__dict__.get('__slots__', ()):
+            if name not in ('__dict__', '__weakref__') and hasattr(obj, name):
+                result[name] = getattr(obj, name)
+    result.update(getattr(obj, '__dict__', {}))
+    return result
+
+
 class ROBEntry(object):
     '''
     Entrée dans la table de réordonnancement. Voir la section 3.7 (Hardware-based speculation) de
      Hennessy (3ème édition).
+
+    Les champs sont déclarés dans `__slots__` (accès plus rapide, moins de mémoire). Une classe
+     dérivée peut déclarer ses propres champs supplémentaires avec `__slots__ = ('champ',)`.
     '''
+    __slots__ = ('i', 'instr', 'state', 'dest', 'value', 'ready', 'funit', 'addr', 'prediction',
+        'checkpoint', 'forward')
 
     def __init__(self, i, instr=None, dest=None, value=None):
         self.i = i
@@ -45,6 +75,11 @@ class ROBEntry(object):
         self.ready = False
         self.funit = None
         self.addr = None #Used for stores...
+        self.prediction = None #Branchements seulement
+        #Branchements seulement: renommage des registres au lancement, {registre: entrée}
+        self.checkpoint = None
+        #Loads spéculatifs seulement: entrée du Store fournissant la valeur (None: la mémoire)
+        self.forward = None
 
     def free(self):
         self.ready = False
@@ -54,16 +89,22 @@ class ROBEntry(object):
         self.instr = None
         self.funit = None
         self.addr = None
+        self.prediction = None
+        self.checkpoint = None
+        self.forward = None
 
     def __repr__(self):
-        #Won't preserve ordering, strictly for debugging purposes.
-        return str(self.__dict__)
+        #Strictly for debugging purposes.
+        return str(dict(fields(self)))
 
 
 class ROB(object):
     '''
     Tampon de réordonnancement, contient essentiellement une liste d'instances de `ROBEntry`
      et quelques fonctions pour faciliter l'utilisation.
+
+    Les indices des Stores présents dans le ROB sont aussi conservés, dans l'ordre du
+     programme, dans `stores`: un Load n'a ainsi à examiner que les Stores qui le précèdent.
     '''
     def __init__(self, maxlen):
         self.maxlen = maxlen
@@ -71,9 +112,24 @@ class ROB(object):
         self.end = 0
         self.count = 0
         self.entries = [ROBEntry(i) for i in range(self.maxlen)]
+        self.stores = deque()
 
     def reset(self):
-        self.__init__(self.maxlen)
+        '''Vide le ROB, sans réallouer ses entrées.'''
+        for e in self:
+            e.free()
+        self.start = 0
+        self.end = 0
+        self.count = 0
+        self.stores.clear()
+
+    def add_store(self, i):
+        '''Indique que l'entrée `i`, la dernière allouée, est un Store.'''
+        self.stores.append(i)
+
+    def age(self, i):
+        '''Position de l'entrée `i` à partir de la tête du ROB (0 pour la tête).'''
+        return (i - self.start) % self.maxlen
 
     def get_free_entry(self):
         '''
@@ -99,15 +155,40 @@ class ROB(object):
         '''
         if self.count > 0:
             self.entries[self.start].free()
+            if len(self.stores) > 0 and self.stores[0] == self.start:
+                self.stores.popleft()
             self.count -= 1
             self.start = (self.start + 1) % self.maxlen
 
+    def squash_after(self, i):
+        '''
+        Retire du ROB toutes les entrées plus jeunes que l'entrée `i` (mauvaise spéculation) et
+         retourne la liste des entrées retirées, avant qu'elles soient libérées, sous forme de
+         tuples (indice, nom de l'unité fonctionnelle). Seules les entrées retirées sont
+         parcourues.
+        '''
+        keep = self.age(i) + 1
+        squashed = []
+        j = (i + 1) % self.maxlen
+        for _ in range(self.count - keep):
+            e = self.entries[j]
+            squashed.append((j, e.funit))
+            e.free()
+            j = (j + 1) % self.maxlen
+        #Les Stores retirés sont les derniers de la liste.
+        while len(self.stores) > 0 and self.age(self.stores[-1]) >= keep:
+            self.stores.pop()
+        self.count = keep
+        self.end = (i + 1) % self.maxlen
+        return squashed
+
     def __getitem__(self, index):
         return self.entries[index]
 
     def __iter__(self):
+        #On compte les entrées: lorsque le ROB est plein, `start` est égal à `end`.
         i = self.start
-        while i != self.end:
+        for _ in range(self.count):
             yield self.entries[i]
             i = (i + 1) % self.maxlen
 
@@ -131,10 +212,23 @@ class FuncUnit(object):
      à l'autre, par exemple la définition du type de prédiction de branchement pour les unités de
      branchement et la définition du temps de multiplication vs. division pour les unités de
      multiplication.
+
+    Les champs sont déclarés dans `__slots__`; une classe dérivée déclare les siens de la même
+     façon (voir `MultUnit` et `BranchUnit`). Les paramètres de la configuration ne
+     correspondant à aucun champ déclaré sont conservés dans le dictionnaire `params`. Une
+     classe dérivée sans `__slots__` peut toujours ajouter des attributs librement.
+
+    Les paramètres de la forme `latency_<OPCODE>` (e.g. `latency_DIV.D="20"`) remplacent la
+     latence de l'unité pour ce code d'opération (voir `get_latency`).
     '''
+    __slots__ = ('name', 'latency', 'latencies', 'params', 'qj', 'qk', 'vj', 'vk', 'busy',
+        'dest', 'time', 'A', 'instr')
+
     def __init__(self, name, latency, **kwargs):
+        self.params = {}
         self.name = name
         self.latency = int(latency)
+        self.latencies = {}
 
         #Assimilation automatique des autres paramètres
         for k, v in kwargs.items():
@@ -142,7 +236,14 @@ class FuncUnit(object):
                 v = int(v)
             except:
                 pass
-            self.__setattr__(k, v)
+            if k.startswith('latency_'):
+                self.latencies[k[len('latency_'):]] = v
+                continue
+            try:
+                self.__setattr__(k, v)
+            except AttributeError:
+                #Aucun champ déclaré pour ce paramètre.
+                self.params[k] = v
 
         self.reset()
 
@@ -165,9 +266,74 @@ class FuncUnit(object):
         self.reset(busy=True)
         self.instr = instr
 
+    def get_latency(self, instr):
+        '''Latence d'exécution de l'instruction `instr`.'''
+        return self.latencies.get(instr.code, self.latency)
+
     def __repr__(self):
-        #Won't preserve ordering.
-        return str(self.__dict__)
+        items = fields(self)
+        items.update(items.pop('params'))
+        return str(dict(items))
+
+
+class MultUnit(FuncUnit):
+    '''
+    Unité de multiplication: la division a sa propre latence (`div_latency`), à moins qu'une
+     latence propre au code d'opération soit donnée.
+    '''
+    __slots__ = ('div_latency',)
+
+    def get_latency(self, instr):
+        if instr.code in self.latencies:
+            return self.latencies[instr.code]
+        #Temps d'exécution différents pour multiplication et division
+        if instr.action.find('*') > -1:
+            return self.latency
+        return self.div_latency
+
+
+class VectorUnit(FuncUnit):
+    '''
+    Unité vectorielle (voir `vector.py`). `latency` est le temps de démarrage de l'opération;
+     les éléments sont ensuite traités par groupes de `lanes` (une voie par élément), un groupe
+     par coup d'horloge. Avec `chaining`, une opération qui reçoit un vecteur dès son écriture
+     se chaîne à l'opération qui l'a produit: ses éléments suivent ceux de cette dernière et
+     seul son temps de démarrage s'ajoute.
+
+    Les instructions à accès mémoire espacés (LVWS, SVWS) ont un troisième opérande source,
+     dans `vs`/`qs`. `sources` contient les entrées du ROB dont les vecteurs opérandes étaient
+     attendus au lancement, et `elements` le nombre d'éléments de l'opération.
+    '''
+    __slots__ = ('lanes', 'chaining', 'qs', 'vs', 'sources', 'elements')
+
+    def __init__(self, name, latency, lanes=1, chaining=0, **kwargs):
+        super(VectorUnit, self).__init__(name, latency, **kwargs)
+        self.lanes = int(lanes)
+        self.chaining = int(chaining) != 0
+        if self.lanes < 1:
+            raise Exception('Une unité vectorielle doit avoir au moins une voie (%s).' % name)
+
+    def reset(self, busy=False):
+        super(VectorUnit, self).reset(busy)
+        self.qs = None
+        self.vs = None
+        self.sources = []
+        self.elements = 0
+
+    def chimes(self):
+        '''Nombre de coups d'horloge pendant lesquels les voies traitent les éléments.'''
+        return max(1, -(-self.elements // self.lanes))
+
+    def get_latency(self, instr, chained=False, startup=None):
+        '''
+        Latence de l'opération: démarrage (par défaut, `latency`) puis traitement des éléments
+         (sauf si chaînée).
+        '''
+        if startup is None:
+            startup = super(VectorUnit, self).get_latency(instr)
+        if chained:
+            return startup
+        return startup + self.chimes() - 1
 
 
 class BranchUnit(FuncUnit):
@@ -178,12 +344,15 @@ class BranchUnit(FuncUnit):
     Pour votre projet, vous pourrez créer une nouvelle unité fonctionnelle de branchement et
      l'utiliser à la place de celle-ci.
     '''
+    __slots__ = ('forward_branch', 'backward_branch', 'prediction')
+
     def __init__(self, name, latency, forward_branch, backward_branch, **kwargs):
         #Important: appel au constructeur de la classe de base.
         super(BranchUnit, self).__init__(name, latency, **kwargs)
 
         self.forward_branch = forward_branch
         self.backward_branch = backward_branch
+        self.prediction = None
 
     def get_prediction(self, PC, dest):
         '''
@@ -215,6 +384,294 @@ class BranchUnit(FuncUnit):
         #Le BranchUnit que nous utilison ne met pas à jour son modèle...
         pass
 
+    def reset_model(self):
+        '''
+        Remet le modèle interne de prédiction à son état initial, appelée par
+         `Simulator.reset`. À redéfinir par les prédicteurs conservant un historique.
+        '''
+        pass
+
+
+def saturate(value, low, high):
+    '''Borne `value` à l'intervalle [low, high] (compteurs saturants).'''
+    return low if value < low else high if value > high else value
+
+
+def fold_history(history, length, bits):
+    '''
+    Replie les `length` derniers bits de l'historique global `history` sur `bits` bits (ou
+     exclusif des morceaux successifs).
+    '''
+    history &= (1 << length) - 1
+    mask = (1 << bits) - 1
+    folded = 0
+    while history:
+        folded ^= history & mask
+        history >>= bits
+    return folded
+
+
+class BimodalPredictor(object):
+    '''
+    Table de 2 ** `table_bits` compteurs saturants de `counter_bits` bits, indexée par
+     l'adresse du branchement. Un compteur dans la moitié supérieure prédit un branchement pris.
+    '''
+    def __init__(self, table_bits=10, counter_bits=2):
+        self.mask = (1 << table_bits) - 1
+        self.max_counter = (1 << counter_bits) - 1
+        self.threshold = 1 << (counter_bits - 1)
+        self.reset()
+
+    def reset(self):
+        #Faiblement non pris
+        self.counters = array('B', [self.threshold - 1]) * (self.mask + 1)
+
+    def predict(self, PC):
+        '''Retourne la prédiction et l'information à repasser à `update`.'''
+        i = PC & self.mask
+        return self.counters[i] >= self.threshold, i
+
+    def train(self, i, taken):
+        self.counters[i] = saturate(self.counters[i] + (1 if taken else -1), 0,
+            self.max_counter)
+
+    def update(self, PC, lookup, taken):
+        self.train(lookup, taken)
+
+    def __repr__(self):
+        return '%s(%i entrées)' % (type(self).__name__, self.mask + 1)
+
+
+class GsharePredictor(BimodalPredictor):
+    '''
+    Compteurs saturants indexés par l'adresse du branchement combinée (ou exclusif) aux
+     `history_bits` derniers résultats de branchements.
+    '''
+    def __init__(self, table_bits=12, history_bits=12, counter_bits=2):
+        self.history_mask = (1 << history_bits) - 1
+        super(GsharePredictor, self).__init__(table_bits, counter_bits)
+
+    def reset(self):
+        super(GsharePredictor, self).reset()
+        self.history = 0
+
+    def predict(self, PC):
+        i = (PC ^ self.history) & self.mask
+        return self.counters[i] >= self.threshold, i
+
+    def update(self, PC, lookup, taken):
+        self.train(lookup, taken)
+        self.history = ((self.history << 1) | taken) & self.history_mask
+
+
+class TournamentPredictor(object):
+    '''
+    Combine un prédicteur bimodal et un prédicteur gshare. Une table de compteurs indexée par
+     l'adresse du branchement choisit, pour chaque branchement, celui des deux qui s'est le plus
+     souvent avéré exact.
+    '''
+    def __init__(self, table_bits=10, history_bits=12, counter_bits=2):
+        self.local = BimodalPredictor(table_bits, counter_bits)
+        self.glob = GsharePredictor(history_bits, history_bits, counter_bits)
+        #Compteurs du choix: la moitié supérieure choisit le prédicteur global.
+        self.chooser = BimodalPredictor(table_bits, counter_bits)
+
+    def reset(self):
+        self.local.reset()
+        self.glob.reset()
+        self.chooser.reset()
+
+    def predict(self, PC):
+        local, i_local = self.local.predict(PC)
+        glob, i_glob = self.glob.predict(PC)
+        use_glob, i_chooser = self.chooser.predict(PC)
+        return glob if use_glob else local, (i_local, i_glob, i_chooser, local, glob)
+
+    def update(self, PC, lookup, taken):
+        i_local, i_glob, i_chooser, local, glob = lookup
+        if local != glob:
+            self.chooser.train(i_chooser, glob == taken)
+        self.local.update(PC, i_local, taken)
+        self.glob.update(PC, i_glob, taken)
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (type(self).__name__, self.local, self.glob)
+
+
+class TagePredictor(object):
+    '''
+    Prédicteur inspiré de TAGE: un prédicteur bimodal de base et des tables étiquetées
+     indexées par des historiques globaux de longueurs croissantes (`history_lengths`). La
+     prédiction vient de la table à l'historique le plus long dont l'étiquette correspond;
+     après une mauvaise prédiction, une entrée est allouée dans une table à l'historique plus
+     long.
+
+    Chaque table étiquetée est faite de trois tableaux: compteurs signés sur 3 bits, étiquettes
+     de `tag_bits` bits et compteurs d'utilité sur 2 bits.
+    '''
+    def __init__(self, table_bits=10, tag_bits=8, history_lengths=(4, 8, 16, 32),
+      base_bits=12):
+        self.table_bits = table_bits
+        self.tag_bits = tag_bits
+        self.history_lengths = list(history_lengths)
+        self.base = BimodalPredictor(base_bits)
+        self.mask = (1 << table_bits) - 1
+        self.tag_mask = (1 << tag_bits) - 1
+        self.history_mask = (1 << max(self.history_lengths)) - 1
+        self.reset()
+
+    def reset(self):
+        self.base.reset()
+        size = self.mask + 1
+        self.counters = [array('b', [0]) * size for _ in self.history_lengths]
+        self.tags = [array('H', [0]) * size for _ in self.history_lengths]
+        self.useful = [array('B', [0]) * size for _ in self.history_lengths]
+        self.history = 0
+        self.updates = 0
+
+    def lookup_indices(self, PC):
+        '''Indices et étiquettes de `PC` dans chacune des tables étiquetées.'''
+        indices = []
+        tags = []
+        for length in self.history_lengths:
+            indices.append((PC ^ fold_history(self.history, length, self.table_bits)) &
+                self.mask)
+            #Étiquette non nulle: 0 indique une entrée jamais allouée.
+            tag = (PC ^ (fold_history(self.history, length, self.tag_bits - 1) << 1)) & \
+                self.tag_mask
+            tags.append(tag or 1)
+        return indices, tags
+
+    def predict(self, PC):
+        indices, tags = self.lookup_indices(PC)
+        base, i_base = self.base.predict(PC)
+        provider = None
+        alternate = base
+        prediction = base
+        for t in range(len(self.history_lengths) - 1, -1, -1):
+            if self.tags[t][indices[t]] == tags[t]:
+                if provider is None:
+                    provider = t
+                    prediction = self.counters[t][indices[t]] >= 0
+                else:
+                    alternate = self.counters[t][indices[t]] >= 0
+                    break
+        return prediction, (indices, tags, i_base, provider, prediction, alternate)
+
+    def update(self, PC, lookup, taken):
+        indices, tags, i_base, provider, prediction, alternate = lookup
+
+        if provider is None:
+            self.base.train(i_base, taken)
+        else:
+            i = indices[provider]
+            self.counters[provider][i] = saturate(self.counters[provider][i] +
+                (1 if taken else -1), -4, 3)
+            if prediction != alternate:
+                self.useful[provider][i] = saturate(self.useful[provider][i] +
+                    (1 if prediction == taken else -1), 0, 3)
+
+        #Allocation d'une entrée dans une table à l'historique plus long.
+        if prediction != taken:
+            start = 0 if provider is None else provider + 1
+            free = [t for t in range(start, len(self.history_lengths)) if
+                self.useful[t][indices[t]] == 0]
+            if len(free) > 0:
+                t = free[0]
+                self.tags[t][indices[t]] = tags[t]
+                self.counters[t][indices[t]] = 0 if taken else -1
+            else:
+                for t in range(start, len(self.history_lengths)):
+                    self.useful[t][indices[t]] -= 1
+
+        #Vieillissement périodique des compteurs d'utilité.
+        self.updates += 1
+        if self.updates % (1 << 16) == 0:
+            for useful in self.useful:
+                for i in range(len(useful)):
+                    useful[i] >>= 1
+
+        self.history = ((self.history << 1) | taken) & self.history_mask
+
+    def __repr__(self):
+        return '%s(%i tables de %i entrées)' % (type(self).__name__,
+            len(self.history_lengths), self.mask + 1)
+
+
+class PredictorUnit(BranchUnit):
+    '''
+    Unité de branchement à prédiction dynamique. Le prédicteur (`model`, voir
+     `BimodalPredictor` et suivants) est partagé par toutes les unités de branchement (voir
+     `share_model`) et survit à `reset`, appelée chaque fois que l'unité est libérée; seule
+     `reset_model` le remet à son état initial. Les classes dérivées définissent
+     `create_model`.
+
+    Le prédicteur est consulté au lancement et mis à jour à l'exécution du branchement.
+    '''
+    __slots__ = ('model', 'pc', 'lookup')
+
+    def __init__(self, name, latency, forward_branch='nottaken', backward_branch='taken',
+      **kwargs):
+        super(PredictorUnit, self).__init__(name, latency, forward_branch, backward_branch,
+            **kwargs)
+        self.model = self.create_model()
+        self.pc = None
+        self.lookup = None
+
+    def create_model(self):
+        raise NotImplementedError
+
+    def get_prediction(self, PC, dest):
+        self.pc = PC
+        self.prediction, self.lookup = self.model.predict(PC)
+        return self.prediction
+
+    def update(self, branch_taken):
+        self.model.update(self.pc, self.lookup, branch_taken)
+
+    def share_model(self, other):
+        '''Utilise le prédicteur de l'unité `other`.'''
+        self.model = other.model
+
+    def reset_model(self):
+        self.model.reset()
+
+
+class BimodalBranchUnit(PredictorUnit):
+    '''Prédicteur bimodal, paramètres `table_bits` et `counter_bits`.'''
+    def create_model(self):
+        return BimodalPredictor(self.params.get('table_bits', 10),
+            self.params.get('counter_bits', 2))
+
+
+class GshareBranchUnit(PredictorUnit):
+    '''Prédicteur gshare, paramètres `table_bits`, `history_bits` et `counter_bits`.'''
+    def create_model(self):
+        table_bits = self.params.get('table_bits', 12)
+        return GsharePredictor(table_bits, self.params.get('history_bits', table_bits),
+            self.params.get('counter_bits', 2))
+
+
+class TournamentBranchUnit(PredictorUnit):
+    '''
+    Prédicteur à tournoi (bimodal contre gshare), paramètres `table_bits` (bimodal et choix),
+     `history_bits` (gshare) et `counter_bits`.
+    '''
+    def create_model(self):
+        return TournamentPredictor(self.params.get('table_bits', 10),
+            self.params.get('history_bits', 12), self.params.get('counter_bits', 2))
+
+
+class TageBranchUnit(PredictorUnit):
+    '''
+    Prédicteur inspiré de TAGE, paramètres `table_bits`, `tag_bits`, `base_bits` et
+     `history_lengths` (longueurs séparées par des virgules, e.g. "4,8,16,32").
+    '''
+    def create_model(self):
+        lengths = str(self.params.get('history_lengths', '4,8,16,32'))
+        return TagePredictor(self.params.get('table_bits', 10), self.params.get('tag_bits', 8),
+            [int(l) for l in lengths.split(',')], self.params.get('base_bits', 12))
+
 
 def check_valid_register(func):
     '''
@@ -222,8 +679,8 @@ def check_valid_register(func):
     '''
     def function_handling(*args, **kwargs):
         temp = args[1]
-        if temp[0] not in ['R', 'F'] or int(temp[1:]) not in range(0, NUM_REGISTERS):
-            raise SimulationException('Accès à un registre non valide: %s.' % args[1])
+        if temp[0] not in ['R', 'F'] or not 0 <= int(temp[1:]) < args[0].num_registers:
+            raise Exception('Accès à un registre non valide: %s.' % args[1])
         else:
             return func(*args, **kwargs)
     return function_handling
@@ -233,25 +690,78 @@ class Registers(OrderedDict):
     '''
     Système de registres du MIPS simulé. Utilisable comme un dictionnaire ordonné. Nous ajoutons
     à celui-ci une vérification de la validité des accès.
+
+    Il y a `num_registers` registres entiers (R) et autant de registres flottants (F).
     '''
-    def __init__(self):
+    def __init__(self, num_registers=NUM_REGISTERS):
         '''Initialisation des registres.'''
         super(Registers, self).__init__(self)
+        self.num_registers = num_registers
 
         self.stat = OrderedDict() #Copie servant uniquement à savoir si un registre est utilisé
         #ou non, requis pour annuler des instructions en cas de branchement tout en permettant
         #d'écrire dans les registres aux commits.
+        #Registres dont l'entrée dans `stat` n'est pas None. Modifier `stat` avec `rename` et
+        #`unrename` pour que `reset_stat` ne parcoure que ces registres.
+        self.renamed = set()
 
         #Remplissage des registres
-        names = ['R%i' % (i) for i in range(NUM_REGISTERS)] + ['F%i' % (i) for i in range(16)]
+        names = ['R%i' % (i) for i in range(num_registers)] + \
+            ['F%i' % (i) for i in range(num_registers)]
         for n in names:
             #Bypass les vérifications pour pouvoir assigner 0 au registre R0
             self.__setitem__(n, 0, bypass=True)
             self.stat[n] = None
 
+    def rename(self, name, rob_i):
+        '''Indique que le registre `name` attend la valeur de l'entrée `rob_i` du ROB.'''
+        self.stat[name] = rob_i
+        self.renamed.add(name)
+
+    def unrename(self, name):
+        '''Indique que le registre `name` n'attend plus de valeur.'''
+        self.stat[name] = None
+        self.renamed.discard(name)
+
     def reset_stat(self):
-        for k, v in self.stat.items():
+        for k in self.renamed:
             self.stat[k] = None
+        self.renamed = set()
+
+    def checkpoint(self):
+        '''Copie du renommage courant, {registre: entrée du ROB}, voir `restore_stat`.'''
+        return dict((k, self.stat[k]) for k in self.renamed)
+
+    def restore_stat(self, checkpoint):
+        '''Remplace le renommage courant par `checkpoint` (voir `checkpoint`).'''
+        self.reset_stat()
+        for k, rob_i in checkpoint.items():
+            self.rename(k, rob_i)
+
+    def __deepcopy__(self, memo):
+        copy = Registers(self.num_registers)
+        copy.restore(self.items())
+        copy.stat.update(self.stat)
+        copy.renamed = set(self.renamed)
+        return copy
+
+    def restore(self, values):
+        '''Remet les registres aux valeurs `values` (liste de tuples (nom, valeur)).'''
+        for k, v in values:
+            super(Registers, self).__setitem__(k, v)
+        self.reset_stat()
+
+    def plain_items(self):
+        '''Liste de tuples (nom, valeur) sérialisable, e.g. en JSON.'''
+        return list(self.items())
+
+    def fingerprint(self):
+        '''Valeurs des registres sous une forme hachable (voir `Simulator.check_loop`).'''
+        return tuple(self.values())
+
+    def digest(self):
+        '''Empreinte (hexadécimale) du contenu des registres.'''
+        return hashlib.sha1(repr(self.plain_items()).encode()).hexdigest()
 
     def __repr__(self):
         '''Affiche le contenu des registres.'''
@@ -268,7 +778,7 @@ class Registers(OrderedDict):
         '''
         # Capturer un essai d'écriture sur R0
         if not bypass and item == 'R0':
-            raise Exception('Impossible d\'utiliser R0, ce '
+            raise ProgramError('Impossible d\'utiliser R0, ce '
                                       'registre est une constante.')
 
         # Assigner la valeur au registre, le valider en entier si RX et en
@@ -288,38 +798,453 @@ class Registers(OrderedDict):
         super(Registers, self).__setitem__(item, value)
 
 
+def check_load_type(word, load_type):
+    '''Retourne `word` s'il est du type lu par le Load (`load_type`: 'int' ou 'float').'''
+    if load_type == 'float' and isinstance(word, float):
+        return word
+    elif load_type == 'int' and isinstance(word, int):
+        return word
+    else:
+        ld_instr = 'LD' if load_type == 'int' else 'L.D'
+        raise ProgramError("Incompatibilité pour %s. On lance une exception plutôt que \
+d'interpréter incorrectement une variable, ce qui produirait des bugs plus difficiles à tracer." %
+ ld_instr)
+
+
+class StoreSetPredictor(object):
+    '''
+    Prédicteur de dépendances entre Loads et Stores, inspiré des ensembles de Stores (store
+     sets, Chrysos et Emer). Une table de 2 ** `table_bits` entiers associe l'adresse de chaque
+     instruction à un numéro d'ensemble (-1: aucun). Après une violation de l'ordre mémoire, le
+     Load et le Store fautifs sont placés dans le même ensemble; un Load attend ensuite les
+     Stores plus vieux de son ensemble dont l'adresse est inconnue.
+    '''
+    def __init__(self, table_bits=10):
+        self.mask = (1 << table_bits) - 1
+        self.reset()
+
+    def reset(self):
+        self.ssit = array('i', [-1]) * (self.mask + 1)
+        self.next_id = 0
+
+    def same_set(self, load_pc, store_pc):
+        '''Vrai si le Load `load_pc` doit attendre le Store `store_pc`.'''
+        s = self.ssit[load_pc & self.mask]
+        return s != -1 and s == self.ssit[store_pc & self.mask]
+
+    def violation(self, load_pc, store_pc):
+        '''Le Load `load_pc` a été exécuté avant le Store `store_pc` écrivant à son adresse.'''
+        l = load_pc & self.mask
+        st = store_pc & self.mask
+        if self.ssit[l] == -1 and self.ssit[st] == -1:
+            self.ssit[l] = self.ssit[st] = self.next_id
+            self.next_id += 1
+        elif self.ssit[l] == -1:
+            self.ssit[l] = self.ssit[st]
+        elif self.ssit[st] == -1:
+            self.ssit[st] = self.ssit[l]
+        else:
+            self.ssit[l] = self.ssit[st] = min(self.ssit[l], self.ssit[st])
+
+
 class Memory(object):
     '''
     Système de mémoire du simulateur MIPS.
+
+    Les autres représentations de la mémoire (e.g. `OverlayMemory`) dérivent de cette classe et
+     redéfinissent `read_word`, `write_word`, `words` et `reset`.
     '''
     def __init__(self, mem_size, init_values):
         self.data = [0.0] * mem_size
         for i, v in enumerate(init_values):
             self.data[i] = eval(v)
+        #Valeur initiale de chaque mot écrit depuis la construction ou le dernier `reset`, seule
+        #partie du contenu initial à restaurer.
+        self.undo = {}
+        #Indices des mots écrits par le programme, voir `modified_words`.
+        self.written = set()
+
+    def read_word(self, i):
+        '''Lit le mot d'indice `i`.'''
+        return self.data[i]
+
+    def write_word(self, i, value):
+        '''Écrit le mot d'indice `i`.'''
+        if i < 0:
+            i += len(self.data)
+        if i not in self.undo:
+            self.undo[i] = self.data[i]
+        self.data[i] = value
+
+    def words(self):
+        '''Retourne le contenu de la mémoire, mot par mot.'''
+        return self.data
+
+    def reset(self):
+        '''Remet la mémoire à son contenu initial, en O(nombre de mots écrits).'''
+        for i, value in self.undo.items():
+            self.data[i] = value
+        self.undo = {}
+        self.written = set()
+
+    def snapshot(self):
+        '''
+        Retourne une copie indépendante de la mémoire, e.g. pour explorer une autre suite de
+         l'exécution. Copie tout le contenu; voir `PagedMemory` pour une copie en O(1).
+        '''
+        copy = Memory.__new__(type(self))
+        copy.__dict__.update(self.__dict__)
+        copy.data = list(self.data)
+        copy.undo = dict(self.undo)
+        copy.written = set(self.written)
+        return copy
+
+    def __len__(self):
+        '''Nombre de mots de la mémoire.'''
+        return len(self.data)
 
     def __repr__(self):
         '''Affiche le contenu de la mémoire.'''
-        return ', '.join(['%s' % d for d in self.data])
+        return ', '.join(['%s' % d for d in self.words()])
 
-    def load(self, index, load_type):
-        i = int(index / 8)
-        if i - index / 8 > 1e-4:
-            raise Exception('Indexation invalide de la mémoire (%i), doit être un multiple de 8' %
-              index)
+    def digest(self):
+        '''
+        Empreinte (hexadécimale) du contenu de la mémoire, soit le SHA-1 de `repr` de la liste
+         des mots. Calculée par blocs pour ne jamais construire toute la chaîne.
+        '''
+        h = hashlib.sha1(b'[')
+        separator = ''
+        for chunk in self.word_chunks():
+            h.update((separator + chunk).encode())
+            separator = ', '
+        h.update(b']')
+        return h.hexdigest()
+
+    def word_chunks(self, chunk_size=4096):
+        '''Représentation textuelle des mots, par blocs de `chunk_size` mots.'''
+        words = iter(self.words())
+        while True:
+            chunk = list(itertools.islice(words, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield ', '.join(map(repr, chunk))
+
+    def modified_words(self):
+        '''
+        Retourne la liste des tuples (adresse en octets, valeur) des mots écrits depuis la
+         construction (ou le dernier `reset`), triés par adresse.
+        '''
+        return [(i * 8, self.read_word(i)) for i in sorted(self.written)]
+
+    def word_range(self, start, end):
+        '''
+        Retourne la liste des tuples (adresse en octets, valeur) des mots d'adresse comprise
+         entre `start` (inclus) et `end` (exclus).
+        '''
+        first = max(0, self.word_index(start))
+        last = min(len(self), -(-end // 8))
+        return [(i * 8, self.read_word(i)) for i in range(first, last)]
 
-        if load_type == 'float' and isinstance(self.data[i], float):
-            return self.data[i]
-        elif load_type == 'int' and isinstance(self.data[i], int):
-            return self.data[i]
+    def write_image(self, buf):
+        '''
+        Écrit le contenu de la mémoire dans `buf` (9 octets par mot): les valeurs sur 8 octets
+         (entier signé ou flottant double) suivies d'un octet par mot donnant son type (0 =
+         flottant, 1 = entier). C'est le format des images de `shared.py`.
+        '''
+        size = len(self)
+        ints = buf[:8 * size].cast('q')
+        floats = buf[:8 * size].cast('d')
+        types = buf[8 * size:9 * size]
+        for i, word in enumerate(self.words()):
+            if isinstance(word, float):
+                floats[i] = word
+                types[i] = 0
+            else:
+                ints[i] = word
+                types[i] = 1
+        ints.release()
+        floats.release()
+        types.release()
+
+    def save(self, path):
+        '''
+        Écrit le contenu de la mémoire dans le fichier `path`. Si son nom se termine par
+         '.npy', un tableau NumPy structuré (champs 'is_float', 'int' et 'float') est écrit;
+         sinon, l'image binaire de `write_image`.
+        '''
+        if path.endswith('.npy'):
+            import numpy as np
+            words = self.words()
+            array = np.zeros(len(self), dtype=[('is_float', '?'), ('int', '<i8'),
+                ('float', '<f8')])
+            for i, word in enumerate(words):
+                if isinstance(word, float):
+                    array[i] = (True, 0, word)
+                else:
+                    array[i] = (False, word, 0.0)
+            np.save(path, array)
         else:
-            ld_instr = 'LD' if load_type == 'int' else 'L.D'
-            raise Exception("Incompatibilité pour %s. On lance une exception plutôt que \
-d'interpréter incorrectement une variable, ce qui produirait des bugs plus difficiles à tracer." %
- ld_instr)
+            buf = bytearray(9 * len(self))
+            self.write_image(memoryview(buf))
+            with open(path, 'wb') as f:
+                f.write(buf)
 
-    def __setitem__(self, index, value):
+    def word_index(self, index):
+        '''Convertit une adresse en octets en indice de mot.'''
         i = int(index / 8)
-        if i - index / 8 > 1e-4:
-            raise Exception('Indexation invalide de la mémoire (%i), doit être un multiple de 8' %
+        if abs(i - index / 8) > 1e-4:
+            raise ProgramError('Indexation invalide de la mémoire (%i), doit être un multiple de 8' %
               index)
-        self.data[i] = value
+        #Indices négatifs: même comportement qu'une liste.
+        if not -len(self) <= i < len(self):
+            raise ProgramError('Adresse hors de la mémoire (%i), qui compte %i octets.' % (index,
+                8 * len(self)))
+        return i
+
+    def load(self, index, load_type):
+        return check_load_type(self.read_word(self.word_index(index)), load_type)
+
+    def __getitem__(self, index):
+        '''Lit le mot à l'adresse `index`, peu importe son type.'''
+        return self.read_word(self.word_index(index))
+
+    def __setitem__(self, index, value):
+        i = self.word_index(index)
+        self.write_word(i, value)
+        self.written.add(i % len(self))
+
+
+class OverlayMemory(Memory):
+    '''
+    Mémoire dont le contenu initial est une image en lecture seule (toute séquence de mots,
+     e.g. une image en mémoire partagée, voir `shared.py`) partagée entre plusieurs
+     simulateurs. Seuls les mots modifiés sont conservés, dans le dictionnaire `delta`.
+    '''
+    def __init__(self, image):
+        self.image = image
+        self.size = len(image)
+        self.delta = {}
+        self.written = set()
+
+    def read_word(self, i):
+        #Même comportement qu'une liste pour les indices négatifs ou invalides.
+        if i < 0:
+            i += self.size
+        if i < 0 or i >= self.size:
+            raise IndexError('list index out of range')
+        try:
+            return self.delta[i]
+        except KeyError:
+            return self.image[i]
+
+    def write_word(self, i, value):
+        if i < 0:
+            i += self.size
+        if i < 0 or i >= self.size:
+            raise IndexError('list assignment index out of range')
+        self.delta[i] = value
+
+    def words(self):
+        delta = self.delta
+        image = self.image
+        for i in range(self.size):
+            yield delta[i] if i in delta else image[i]
+
+    def reset(self):
+        self.delta.clear()
+        self.written = set()
+
+    def flush(self):
+        '''
+        Écrit les mots modifiés dans l'image (qui doit alors accepter l'écriture, e.g.
+         `shared.MemoryImage`) puis les oublie: les lectures suivantes voient l'image, et donc
+         les écritures des autres simulateurs qui la partagent (voir `multicore.py`).
+        '''
+        for i, value in self.delta.items():
+            self.image[i] = value
+        self.delta.clear()
+
+    def snapshot(self):
+        copy = OverlayMemory(self.image)
+        copy.delta = dict(self.delta)
+        copy.written = set(self.written)
+        return copy
+
+    def __len__(self):
+        return self.size
+
+
+class PagedMemory(Memory):
+    '''
+    Mémoire découpée en pages de `page_size` mots, partagées par copie sur écriture entre une
+     mémoire et ses copies (`snapshot`). Prendre une copie coûte O(1); une page n'est dupliquée
+     que lorsqu'elle est modifiée pour la première fois par l'une des mémoires qui la partagent.
+
+    Les pages modifiées depuis la construction (ou le dernier appel à `clear_dirty`) sont
+     retournées par `dirty_pages`.
+    '''
+    def __init__(self, mem_size, init_values, page_size=512):
+        values = [eval(v) for v in init_values]
+        if len(values) > mem_size:
+            raise IndexError('list assignment index out of range')
+        self.size = mem_size
+        self.page_size = page_size
+        #Table des pages. Elle peut elle-même être partagée avec d'autres mémoires, auquel cas
+        #elle est copiée avant sa première modification. Les pages entières sans valeur
+        #initiale partagent toutes la même page de zéros.
+        zero_page = [0.0] * page_size
+        self.pages = []
+        for i in range(0, mem_size, page_size):
+            length = min(page_size, mem_size - i)
+            page = values[i:i + length]
+            if page or length < page_size:
+                page += [0.0] * (length - len(page))
+            else:
+                page = zero_page
+            self.pages.append(page)
+        self.table_owned = False
+        #Pages appartenant à cette mémoire seulement, modifiables sur place.
+        self.owned = set()
+        self.dirty = set()
+        self.written = set()
+        #Le contenu initial est partagé comme une copie, voir `reset`.
+        self.initial_pages = self.pages
+
+    def read_word(self, i):
+        if i < 0:
+            i += self.size
+        if i < 0 or i >= self.size:
+            raise IndexError('list index out of range')
+        page, offset = divmod(i, self.page_size)
+        return self.pages[page][offset]
+
+    def write_word(self, i, value):
+        if i < 0:
+            i += self.size
+        if i < 0 or i >= self.size:
+            raise IndexError('list assignment index out of range')
+        page, offset = divmod(i, self.page_size)
+        if page not in self.owned:
+            #Copie sur écriture
+            if not self.table_owned:
+                self.pages = list(self.pages)
+                self.table_owned = True
+            self.pages[page] = list(self.pages[page])
+            self.owned.add(page)
+        self.pages[page][offset] = value
+        self.dirty.add(page)
+
+    def words(self):
+        for page in self.pages:
+            for word in page:
+                yield word
+
+    def reset(self):
+        self.pages = self.initial_pages
+        self.table_owned = False
+        self.owned = set()
+        self.dirty = set()
+        self.written = set()
+
+    def snapshot(self):
+        copy = PagedMemory.__new__(PagedMemory)
+        copy.__dict__.update(self.__dict__)
+        #Toutes les pages (et la table) sont maintenant partagées.
+        self.table_owned = False
+        self.owned = set()
+        copy.table_owned = False
+        copy.owned = set()
+        copy.dirty = set(self.dirty)
+        copy.written = set(self.written)
+        return copy
+
+    def dirty_pages(self):
+        '''Indices des pages modifiées depuis la construction ou le dernier `clear_dirty`.'''
+        return sorted(self.dirty)
+
+    def clear_dirty(self):
+        self.dirty = set()
+
+    def __len__(self):
+        return self.size
+
+
+class SparseMemory(Memory):
+    '''
+    Mémoire creuse: seules les pages de `page_size` mots ayant été écrites sont allouées. La
+     lecture d'un mot jamais écrit retourne 0.0, comme pour `Memory`. Permet de simuler de
+     très grands espaces d'adressage dont le programme n'utilise que quelques régions.
+    '''
+    def __init__(self, mem_size, init_values, page_size=4096):
+        self.size = mem_size
+        self.page_size = page_size
+        self.pages = {}
+        for i, v in enumerate(init_values):
+            self.write_word(i, eval(v))
+        self.written = set()
+        #Contenu initial, voir `reset`.
+        self.initial_pages = dict((p, list(page)) for p, page in self.pages.items())
+
+    def read_word(self, i):
+        if i < 0:
+            i += self.size
+        if i < 0 or i >= self.size:
+            raise IndexError('list index out of range')
+        page, offset = divmod(i, self.page_size)
+        try:
+            return self.pages[page][offset]
+        except KeyError:
+            return 0.0
+
+    def write_word(self, i, value):
+        if i < 0:
+            i += self.size
+        if i < 0 or i >= self.size:
+            raise IndexError('list assignment index out of range')
+        page, offset = divmod(i, self.page_size)
+        if page not in self.pages:
+            self.pages[page] = [0.0] * min(self.page_size, self.size - page * self.page_size)
+        self.pages[page][offset] = value
+
+    def words(self):
+        for p in range(0, (self.size + self.page_size - 1) // self.page_size):
+            page = self.pages.get(p)
+            if page is None:
+                for _ in range(min(self.page_size, self.size - p * self.page_size)):
+                    yield 0.0
+            else:
+                for word in page:
+                    yield word
+
+    def reset(self):
+        self.pages = dict((p, list(page)) for p, page in self.initial_pages.items())
+        self.written = set()
+
+    def snapshot(self):
+        copy = SparseMemory.__new__(SparseMemory)
+        copy.__dict__.update(self.__dict__)
+        copy.pages = dict((p, list(page)) for p, page in self.pages.items())
+        copy.written = set(self.written)
+        return copy
+
+    def word_chunks(self, chunk_size=None):
+        #Une page jamais écrite a toujours la même représentation.
+        empty_page = None
+        for p in range(0, (self.size + self.page_size - 1) // self.page_size):
+            page = self.pages.get(p)
+            if page is not None:
+                yield ', '.join(map(repr, page))
+            elif (p + 1) * self.page_size <= self.size:
+                if empty_page is None:
+                    empty_page = ', '.join(['0.0'] * self.page_size)
+                yield empty_page
+            else:
+                yield ', '.join(['0.0'] * (self.size - p * self.page_size))
+
+    def __len__(self):
+        return self.size
+
+
+#Représentations de la mémoire pouvant être choisies dans la configuration, e.g.
+#<Memory size="1000000000" backend="sparse">
+memory_backends = {'flat': Memory, 'paged': PagedMemory, 'sparse': SparseMemory}
@@ -38,9 +38,32 @@ INSTRUCTION_SET = {'LD':     ('Load', '$0 = $1'),        # 0. Memory Read
                    'BNEZ':   ('Branch', '$2 = $1 if $0 != 0 else $2'),
                    'BEQ':    ('Branch', '$3 = $2 if $0 == $1 else $3'),
                    'BNE':    ('Branch', '$3 = $2 if $0 != $1 else $3'),
-                   'J':      ('Branch', '$1 = $0')
+                   'J':      ('Branch', '$1 = $0'),
+                   'MTVL':   ('ALU', '$0 = $1 + $2', '+'),   # 24. Vector operations, voir vector.py
+                   'LV':     ('Vector', '$0 = $1'),
+                   'LVWS':   ('Vector', '$0 = $1'),
+                   'SV':     ('Vector', '$1 = $0'),
+                   'SVWS':   ('Vector', '$1 = $0'),
+                   'ADDV':   ('Vector', '$0 = $1 + $2', '+'),
+                   'SUBV':   ('Vector', '$0 = $1 - $2', '-'),
+                   'MULV':   ('Vector', '$0 = $1 * $2', '*'),
+                   'ADDVS':  ('Vector', '$0 = $1 + $2', '+'),
+                   'MULVS':  ('Vector', '$0 = $1 * $2', '*'),
+                   'SUMV':   ('Vector', '$0 = sum($1)', '+')
                    }
 
+# Opérandes implicites ajoutés (avant, après) aux opérandes écrits dans le programme, e.g.
+# MTVL R1 devient MTVL VL,R1,R0 et LV V1,0(R1) devient LV V1,0(R1),VL.
+IMPLICIT_OPERANDS = {'MTVL': (['VL'], ['R0']),
+                     'LV':   ([], ['VL']),
+                     'LVWS': ([], ['VL'])}
+
+# Indices des opérandes sources des instructions vectorielles qui ne suivent pas la forme
+# habituelle DEST,SRC1,SRC2.
+VECTOR_SOURCES = {'LVWS': [1, 2, 3],
+                  'SV':   [0, 1],
+                  'SVWS': [0, 1, 2]}
+
 memory_re = re.compile('^-*\d+\([RF][-]?\d+[.]?\d*\)$')
 
 
@@ -60,6 +83,20 @@ def interpret_asm(source_file):
     source = f.readlines()
     print('Fichier source lu avec succès!')
 
+    source = interpret_source(source)
+    print(source)
+
+    return source
+
+
+def interpret_source(source):
+    '''
+    Décode un programme assembleur déjà en mémoire, soit une chaîne de caractères, soit une
+     liste de lignes. Voir `interpret_asm`.
+    '''
+    if isinstance(source, str):
+        source = source.splitlines()
+
     # Retrait des caractères de fin de ligne et des commentaires
     source = list(map(lambda x: x.strip().split(';')[0], source))
     source = [s for s in source if s != '']
@@ -72,10 +109,7 @@ def interpret_asm(source_file):
 
     # Mapping des opérations dans la table en haut du fichier.
     # Retourne une liste de tuple [(instruction_reference, parametres), ...]
-    source = parse_instructions(source, labels)
-    print(source)
-
-    return source
+    return parse_instructions(source, labels)
 
 
 def parse_labels(source):
@@ -135,6 +169,9 @@ def parse_instructions(source, labels):
         instr = INSTRUCTION_SET[operation]
 
         operands = elems[1].split(',')
+        if operation in IMPLICIT_OPERANDS:
+            before, after = IMPLICIT_OPERANDS[operation]
+            operands = before + operands + after
         operator = None
         if len(instr) > 2:
             operator = instr[2]
@@ -11,7 +11,6 @@
 
 '''
 
-import argparse
 import sys
 if sys.version_info < (2, 7):
     print('ATTENTION!!!')
@@ -20,49 +19,108 @@ if sys.version_info < (2, 7):
     print('est requise pour ce simulateur.')
     sys.exit(1)
 
+from cli import make_parser
 import interpreter as interp
 import simulator as sim
+from components import SparseMemory
 
 auteurs = ''
 
-def main(config_file, source_file, trace_file, latex_trace_file, debug):
+#Au-delà de ce nombre de mots, la mémoire n'est pas affichée en entier par défaut.
+MAX_FULL_DUMP = 1 << 20
+
+def main(config_file, source_file, trace_file, latex_trace_file, debug, max_cycles=None,
+  max_instructions=None, max_time=None, detect_loops=False, stall_limit=None, mem_dump=None,
+  mem_ranges=None, mem_file=None):
+    if mem_ranges is None:
+        mem_ranges = []
+
     # Génération du simulateur
     simulator = sim.Simulator(config_file, source_file, trace_file, latex_trace_file, debug)
+    mem_dump = choose_mem_dump(simulator.mem, mem_dump)
 
     # Affichage de l'état initial de la mémoire et des registre.
     print('État initial des registres: ' + str(simulator.regs))
-    print('État initial de la mémoire: ' + str(simulator.mem))
+    print_memory(simulator.mem, 'initial', mem_dump, mem_ranges)
 
     # Démarrage du simulateur
     print('Démarrage de la simulation.')
-    err = simulator.go()
+    err = simulator.go(max_cycles, max_instructions, max_time, detect_loops, stall_limit)
     print('Arrêt de la simulation.')
 
     # Affichage de l'état final de la mémoire et des registre.
     print('État final des registres : ' + str(simulator.regs))
-    print('État final de la mémoire : ' + str(simulator.mem))
+    print_memory(simulator.mem, 'final', mem_dump, mem_ranges)
+    if mem_file:
+        simulator.mem.save(mem_file)
+        print('Contenu final de la mémoire écrit dans %s.' % mem_file)
+    if simulator.cache is not None:
+        print(simulator.cache.report())
+    if simulator.cdb_buses > 0:
+        print(simulator.cdb_report())
+    if simulator.disambiguation == 'speculative':
+        print(simulator.memory_report())
 
     # Affichage de l'état du processus à sa terminaison.
     if err == 0:
         print('Simulation terminée avec succès.')
+    elif simulator.abort_reason is not None:
+        print('Simulation interrompue: %s' % simulator.abort_reason)
     else:
         print('Une erreur est survenue lors de l\'exécution du programme.')
     return err, simulator
 
+
+def format_words(words):
+    return ', '.join(['%i: %s' % (addr, value) for addr, value in words])
+
+
+def choose_mem_dump(mem, mem_dump):
+    '''
+    Retourne le mode d'affichage de la mémoire `mem`. Par défaut (`mem_dump` None), elle est
+     affichée en entier, sauf si elle est creuse ou de plus de `MAX_FULL_DUMP` mots: seuls
+     les mots modifiés le sont alors. L'affichage complet d'une mémoire creuse est refusé.
+    '''
+    if isinstance(mem, SparseMemory) and mem_dump == 'full':
+        sys.stderr.write('Mémoire creuse de %i mots: affichage complet refusé, seuls les mots '
+            'modifiés seront affichés (voir --mem-dump).\n' % len(mem))
+        return 'modified'
+    if mem_dump is None:
+        if isinstance(mem, SparseMemory) or len(mem) > MAX_FULL_DUMP:
+            return 'modified'
+        return 'full'
+    return mem_dump
+
+
+def print_memory(mem, when, mem_dump, mem_ranges):
+    '''
+    Affiche la mémoire `mem` au début (`when` = 'initial') ou à la fin ('final') de la
+     simulation, selon le mode `mem_dump` (voir `cli.make_parser`).
+    '''
+    #Alignement des messages d'origine
+    label = 'État %s de la mémoire%s: ' % (when, '' if when == 'initial' else ' ')
+    if mem_dump == 'full':
+        print(label + str(mem))
+    elif mem_dump == 'digest':
+        print('Empreinte %se de la mémoire: %s' % (when, mem.digest()))
+    elif mem_dump == 'modified' and when == 'final':
+        modified = mem.modified_words()
+        print('Mots modifiés de la mémoire (%i): %s' % (len(modified), format_words(modified)))
+
+    for start, end in mem_ranges:
+        print('État %s de la mémoire [%i:%i]: %s' % (when, start, end,
+            format_words(mem.word_range(start, end))))
+
+
+def main_from_args(args):
+    '''Lance `main` avec les arguments retournés par l'analyseur de `make_parser`.'''
+    return main(args.config_file, args.source_file, args.trace_file, args.latex_trace_file,
+        args.debug, args.max_cycles, args.max_instructions, args.max_time, args.detect_loops,
+        args.stall_limit, args.mem_dump, args.mem_ranges, args.mem_file)
+
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Simulateur de MIPS en Python (2.7+). Testé avec\
- Python 2.7 et 3.3.', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-
-    parser.add_argument('config_file', help="Fichier xml contenant la configuration du simulateur.")
-    parser.add_argument('source_file', help="Fichier contenant le code source à exécuter.")
-    parser.add_argument('trace_file', nargs='?', help="Ficher dans lequel sera écrit \
-l'état du simulateur à tous les pas de temps.")
-    parser.add_argument('-L', dest='latex_trace_file', help="Fichier pour écrire une trace sous \
-format LaTeX (surtout les tableaux).")
-    parser.add_argument('-d', default=False, action='store_true', dest='debug', help="Force \
-l'impression de davantage d'information à chaque étape de l'exécution dans la ligne de commande.")
-
-    args = parser.parse_args()
-
-    err, simulator = main(args.config_file, args.source_file, args.trace_file,
-        args.latex_trace_file, args.debug)
+    args = make_parser().parse_args()
+
+    err, simulator = main_from_args(args)
+    sys.exit(err)
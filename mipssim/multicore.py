@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Simulation de plusieurs coeurs partageant une même mémoire.
+
+Chaque coeur est un `simulator.Simulator` exécuté dans son propre processus, avec son propre
+ programme ou le même programme pour tous; dans ce cas, le numéro du coeur peut être placé dans
+ un registre (`--core-id`) pour que chacun traite sa part des données. La mémoire initiale est
+ publiée en mémoire partagée (voir `shared.py`) et les coeurs avancent par tranches de
+ `quantum` coups d'horloge, séparées par des barrières de synchronisation.
+
+Si un coeur meurt sans prévenir (processus tué, interpréteur planté) ou si une barrière attend
+ plus de `timeout` secondes, les autres coeurs sont arrêtés en erreur plutôt que d'attendre
+ indéfiniment. Une tranche ne doit donc pas durer plus de `timeout` secondes.
+
+Modèle de cohérence: pendant une tranche, un coeur voit ses propres écritures et le contenu de
+ la mémoire partagée au début de la tranche. À la barrière, les coeurs y publient leurs
+ écritures l'un après l'autre, dans l'ordre de leurs numéros: si plusieurs coeurs ont écrit le
+ même mot pendant la tranche, le coeur de plus grand numéro l'emporte. Avec `quantum` = 1, les
+ écritures sont visibles par les autres coeurs dès le coup d'horloge suivant.
+
+    python multicore.py ../conf/dot_prod.xml ../asm/dot_prod.mips -n 4 --core-id R9
+'''
+
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+#local imports
+import components
+import interpreter as interp
+import shared
+import simulator as sim
+
+
+def run_quantum(simulator, cycles, max_cycles=None):
+    '''
+    Avance `simulator` d'au plus `cycles` coups d'horloge. Retourne son code de retour (voir
+     `simulator.ExitCode`) s'il a terminé, ou None.
+    '''
+    try:
+        for _ in range(cycles):
+            if simulator.step() != 0:
+                return sim.ExitCode.SUCCESS
+            simulator.clock += 1
+            if max_cycles is not None and simulator.clock > max_cycles:
+                return simulator.abort(sim.ExitCode.CYCLE_BUDGET,
+                    'Nombre maximal de coups d\'horloge atteint (%i).' % max_cycles)
+    except components.ProgramError as e:
+        return simulator.abort(sim.ExitCode.PROGRAM_ERROR, str(e))
+    except Exception as e:
+        simulator.abort_reason = '%s: %s' % (type(e).__name__, e)
+        return sim.ExitCode.UNEXPECTED_ERROR
+    return None
+
+
+def run_core(core_id, config_file, source_file, memory_descriptor, quantum, core_id_register,
+  max_cycles, barrier, done, progress, results):
+    '''
+    Processus d'un coeur. `done` est un tableau partagé indiquant quels coeurs ont terminé et
+     `progress` le nombre de tranches effectuées par chacun (voir `collect_results`); le
+     résultat (numéro, code de retour, coups d'horloge, instructions sanctionnées, registres,
+     raison de l'arrêt) est placé dans la file `results`.
+    '''
+    sys.stdout = open(os.devnull, 'w')
+    cores = len(done)
+    try:
+        config = sim.read_config(config_file)
+        if core_id_register is not None:
+            config.registers.append((core_id_register, str(core_id)))
+        memory = shared.attach_memory(memory_descriptor)
+        simulator = sim.Simulator(config, interp.interpret_asm(source_file), memory=memory)
+    except Exception as e:
+        #Les autres coeurs ne doivent pas attendre celui-ci indéfiniment.
+        barrier.abort()
+        results.put((core_id, sim.ExitCode.UNEXPECTED_ERROR, 0, 0, [], '%s: %s' %
+            (type(e).__name__, e)))
+        return
+
+    exit_code = None
+    try:
+        while True:
+            if exit_code is None:
+                exit_code = run_quantum(simulator, quantum, max_cycles)
+            done[core_id] = exit_code is not None
+            progress[core_id] += 1
+
+            #Publication des écritures, un coeur à la fois, une fois la tranche terminée
+            #par tous.
+            barrier.wait()
+            for k in range(cores):
+                if k == core_id:
+                    try:
+                        memory.flush()
+                    except components.ProgramError as e:
+                        #Le coeur s'arrête, mais doit continuer à franchir les barrières.
+                        if exit_code in (None, sim.ExitCode.SUCCESS):
+                            exit_code = sim.ExitCode.PROGRAM_ERROR
+                            simulator.abort_reason = str(e)
+                        done[core_id] = True
+                        memory.reset()
+                barrier.wait()
+            finished = all(done)
+            #Personne ne doit modifier `done` avant que tous l'aient lu.
+            barrier.wait()
+            if finished:
+                break
+    except threading.BrokenBarrierError:
+        if exit_code is None:
+            exit_code = sim.ExitCode.UNEXPECTED_ERROR
+            simulator.abort_reason = 'Un autre coeur a échoué ou ne répond plus.'
+
+    results.put((core_id, exit_code, simulator.clock, simulator.committed,
+        simulator.regs.plain_items(), simulator.abort_reason))
+
+
+def collect_results(processes, results, barrier, progress, timeout):
+    '''
+    Attend le résultat de chaque coeur dans la file `results`. Un processus terminé en erreur
+     sans avoir transmis de résultat (e.g. tué) reçoit un résultat d'erreur et `barrier` est
+     brisée pour libérer les autres coeurs. Si aucun coeur n'a progressé (voir `progress`)
+     depuis 2 * `timeout` secondes, ceux qui n'ont pas répondu sont arrêtés.
+    '''
+    collected = {}
+    last_progress = list(progress)
+    last_change = time.time()
+    while len(collected) < len(processes):
+        try:
+            result = results.get(timeout=1)
+            collected[result[0]] = result
+            last_change = time.time()
+            continue
+        except queue.Empty:
+            pass
+
+        for k, p in enumerate(processes):
+            #Un processus terminé normalement (code 0) a toujours transmis son résultat.
+            if k not in collected and p.exitcode not in (None, 0):
+                collected[k] = (k, sim.ExitCode.UNEXPECTED_ERROR, 0, 0, [],
+                    'Processus du coeur terminé anormalement (code %i).' % p.exitcode)
+                #Le processus a pu mourir en tenant le verrou de la barrière: `abort` bloquerait
+                #alors indéfiniment, d'où le thread.
+                threading.Thread(target=barrier.abort, daemon=True).start()
+
+        current = list(progress)
+        if current != last_progress:
+            last_progress = current
+            last_change = time.time()
+        elif time.time() - last_change > 2 * timeout:
+            #Un coeur arrêté dans une barrière peut bloquer tous les autres sans qu'aucun
+            #n'atteigne le délai de la barrière.
+            for k, p in enumerate(processes):
+                if k not in collected:
+                    p.kill()
+                    collected[k] = (k, sim.ExitCode.UNEXPECTED_ERROR, 0, 0, [],
+                        'Le coeur ne répond plus.')
+    return [collected[k] for k in sorted(collected)]
+
+
+def main(config_file, source_files, cores=None, quantum=100, core_id_register=None,
+  max_cycles=None, timeout=300):
+    if cores is None:
+        cores = len(source_files)
+    if len(source_files) == 1:
+        source_files = source_files * cores
+    elif len(source_files) != cores:
+        raise Exception('Un programme par coeur ou un seul programme pour tous (%i programmes, '
+            '%i coeurs).' % (len(source_files), cores))
+    if quantum < 1:
+        raise Exception('La durée d\'une tranche doit être d\'au moins un coup d\'horloge.')
+
+    config = sim.read_config(config_file)
+    with shared.SharedImages() as images:
+        descriptor = images.publish_memory(config.create_memory())
+        barrier = multiprocessing.Barrier(cores, timeout=timeout)
+        done = multiprocessing.Array('b', cores, lock=False)
+        progress = multiprocessing.Array('l', cores, lock=False)
+        results_queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_core, args=(k, config_file,
+            source_files[k], descriptor, quantum, core_id_register, max_cycles, barrier, done,
+            progress, results_queue)) for k in range(cores)]
+        for p in processes:
+            p.start()
+        #Vider la file avant d'attendre les processus, qui ne terminent qu'une fois leur
+        #résultat transmis.
+        results = collect_results(processes, results_queue, barrier, progress, timeout)
+        for p in processes:
+            p.join()
+
+        image = shared.MemoryImage(images.blocks[0], descriptor[2])
+        words = [image[i] for i in range(len(image))]
+        image.release()
+
+    err = 0
+    for core_id, exit_code, clock, committed, registers, abort_reason in results:
+        print('Coeur %i (%s): %i coups d\'horloge, %i instructions sanctionnées.' % (core_id,
+            source_files[core_id], clock, committed))
+        print('État final des registres : ' + ', '.join(['%s: %s' % r for r in registers]))
+        if exit_code != sim.ExitCode.SUCCESS:
+            print('Simulation interrompue: %s' % abort_reason)
+            err = max(err, exit_code)
+    print('État final de la mémoire : ' + ', '.join(['%s' % w for w in words]))
+    print('Simulation terminée au coup d\'horloge %i.' % max(r[2] for r in results))
+    return err
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simule plusieurs coeurs partageant la \
+mémoire, chacun dans son propre processus.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('config_file', help='Fichier xml de configuration (commun à tous les \
+coeurs, mémoire initiale comprise).')
+    parser.add_argument('source_files', nargs='+', help='Programme de chaque coeur, ou un seul \
+programme exécuté par tous les coeurs.')
+    parser.add_argument('-n', dest='cores', type=int, default=None, help='Nombre de coeurs \
+(par défaut, le nombre de programmes).')
+    parser.add_argument('-q', dest='quantum', type=int, default=100, help='Nombre de coups \
+d\'horloge entre deux synchronisations des coeurs.')
+    parser.add_argument('--core-id', dest='core_id_register', default=None, help='Registre \
+initialisé au numéro du coeur (0, 1, ...), e.g. R9.')
+    parser.add_argument('--max-cycles', type=int, default=None, help="Nombre maximal de coups \
+d'horloge par coeur.")
+    parser.add_argument('--timeout', type=float, default=300, help="Attente maximale à une \
+barrière de synchronisation, en secondes.")
+
+    args = parser.parse_args()
+
+    sys.exit(main(args.config_file, args.source_files, args.cores, args.quantum,
+        args.core_id_register, args.max_cycles, args.timeout))
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Cache persistant des résultats de simulation.
+
+Le résultat de `Simulator.go` ne dépend que du programme décodé, de la configuration effective,
+ des options de `go` et du code du simulateur. Une empreinte de ces quatre éléments sert de clé
+ à un fichier JSON contenant le nombre de cycles, le code de retour, les statistiques et les
+ empreintes de l'état final. La taille totale du cache est bornée; les entrées les moins
+ récemment utilisées sont effacées en premier.
+'''
+
+import ast
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+
+#local imports
+import simulator as sim
+
+
+def simulator_modules(directory, root='simulator.py'):
+    '''
+    Fichiers sources (relatifs à `directory`) dont dépend le résultat d'une simulation: `root`
+     et les modules locaux qu'il importe, directement ou non.
+    '''
+    modules = set()
+    pending = [root]
+    while pending:
+        name = pending.pop()
+        if name in modules:
+            continue
+        modules.add(name)
+        with open(os.path.join(directory, name), 'rb') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                imported = [node.module]
+            else:
+                continue
+            for module in imported:
+                path = module.replace('.', os.sep)
+                for candidate in [path + '.py', os.path.join(path, '__init__.py')]:
+                    if os.path.isfile(os.path.join(directory, candidate)):
+                        pending.append(candidate)
+    return sorted(modules)
+
+
+def simulator_version():
+    '''Empreinte du code source du simulateur.'''
+    h = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in simulator_modules(directory):
+        with open(os.path.join(directory, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+_version = simulator_version()
+
+
+def _plain(value):
+    '''
+    Équivalent JSON de `value`, où chaque dictionnaire devient une liste de paires: l'ordre d'un
+     OrderedDict (e.g. celui des types d'unités) est conservé, celui d'un dict est trié.
+    '''
+    if isinstance(value, OrderedDict):
+        return [[k, _plain(v)] for k, v in value.items()]
+    if isinstance(value, dict):
+        return [[k, _plain(v)] for k, v in sorted(value.items())]
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def config_digest(config):
+    '''Empreinte d'une configuration (`simulator.Configuration`), tous ses champs compris.'''
+    content = json.dumps(_plain(dict(vars(config))))
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def program_digest(instructions):
+    '''Empreinte d'un programme décodé.'''
+    return hashlib.sha1(json.dumps(instructions).encode()).hexdigest()
+
+
+def simulation_key(config, instructions, go_options={}):
+    '''Clé identifiant le résultat d'une simulation.'''
+    content = json.dumps([_version, config_digest(config), program_digest(instructions),
+        sorted(go_options.items())])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class ResultCache(object):
+    '''
+    Cache de résultats sur disque, un fichier JSON par clé dans `directory`. Lorsque la taille
+     totale dépasse `max_bytes`, les entrées les moins récemment utilisées sont effacées.
+    '''
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        '''Retourne le résultat associé à `key` ou None s'il n'est pas dans le cache.'''
+        try:
+            with open(self.path(key), 'r') as f:
+                result = json.load(f)
+            #La date de modification sert à l'éviction des entrées les moins utilisées.
+            os.utime(self.path(key), None)
+            return result
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        '''Ajoute (ou remplace) le résultat associé à `key`.'''
+        #Écriture dans un fichier temporaire puis renommage, pour que les autres processus ne
+        #voient jamais une entrée incomplète.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(result, f)
+            os.replace(temp_path, self.path(key))
+        except:
+            #`evict` ne voit que les entrées .json: ne pas laisser le fichier temporaire.
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        '''Efface les entrées les moins récemment utilisées jusqu'à respecter `max_bytes`.'''
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                #Déjà effacée par un autre processus.
+                pass
+            total -= size
+
+
+def simulation_result(simulator, exit_code):
+    '''Résultat à conserver dans le cache pour une simulation terminée.'''
+    return {'cycles': simulator.clock, 'exit_code': exit_code,
+        'committed': simulator.committed, 'abort_reason': simulator.abort_reason,
+        'state_hash': simulator.state_digest(), 'regs_digest': simulator.regs.digest(),
+        'mem_digest': simulator.mem.digest(), 'registers': simulator.regs.plain_items()}
+
+
+def cached_go(config, instructions, cache=None, go_options={}, refresh=False, memory=None):
+    '''
+    Simule `instructions` avec la configuration `config` et retourne le résultat (voir
+     `simulation_result`), en le lisant dans `cache` s'il s'y trouve déjà. Si `refresh` est
+     vrai, la simulation est refaite et le cache mis à jour. `memory` remplace la mémoire
+     initiale décrite par `config` (même contenu, autre représentation).
+    '''
+    if cache is not None:
+        key = simulation_key(config, instructions, go_options)
+        if not refresh:
+            result = cache.get(key)
+            if result is not None:
+                return result
+
+    simulator = sim.Simulator(config, instructions, memory=memory)
+    try:
+        exit_code = simulator.go(**go_options)
+    except Exception as e:
+        #Le programme plante toujours de la même façon: le résultat peut être conservé.
+        simulator.abort_reason = '%s: %s' % (type(e).__name__, e)
+        exit_code = sim.ExitCode.UNEXPECTED_ERROR
+    result = simulation_result(simulator, exit_code)
+    #Un arrêt sur le temps d'exécution dépend de la machine, il n'est pas reproductible.
+    if cache is not None and exit_code != sim.ExitCode.TIME_BUDGET:
+        cache.put(key, result)
+    return result
+
+
+if __name__ == '__main__':
+    sys.stderr.write('Ce module n\'est pas utilisable seul.')
+    sys.exit(-1)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Recherche dans l'espace des paramètres des unités fonctionnelles (nombre, latences, classe du
+ prédicteur de branchement, etc.) par montée de colline avec redémarrages aléatoires.
+
+Une simulation est aussi abandonnée au-delà de `--max-cycles` coups d'horloge ou, avec
+ `--stall-limit`, si aucune instruction ne progresse pendant ce nombre de coups d'horloge: un
+ candidat qui ne termine pas n'occupe pas un processus indéfiniment.
+
+Deux objectifs sont possibles:
+
+* avec `--target-cycles`, trouver la configuration la moins coûteuse qui termine le programme en
+  au plus ce nombre de cycles;
+* sinon, trouver la configuration la plus rapide dont le coût ne dépasse pas `--budget`.
+
+Le coût matériel est une expression Python évaluée sur la configuration, par exemple
+ "ALU.number + 4 * Mult.number + 16 / Mult.latency". Les voisins d'un point sont simulés en
+ parallèle et une simulation est abandonnée dès que son horloge dépasse le meilleur nombre de
+ cycles connu (ou la cible): seul compte le fait qu'elle ne peut plus gagner.
+'''
+
+import argparse
+import multiprocessing
+import random
+import sys
+
+#local imports
+import simulator as sim
+import sweep
+
+#Borne partagée entre les processus: une simulation dont l'horloge la dépasse est abandonnée.
+_bound = None
+#Nombre maximal de coups d'horloge d'une simulation, par défaut.
+MAX_CYCLES = 1000000
+
+
+class UnitParams(object):
+    '''Paramètres d'un type d'unité fonctionnelle, accessibles comme attributs dans le coût.'''
+    def __init__(self, params):
+        for k, v in params.items():
+            try:
+                v = int(v)
+            except:
+                try:
+                    v = float(v)
+                except:
+                    pass
+            self.__dict__[k] = v
+
+
+def hardware_cost(config, expression):
+    '''Évalue l'expression de coût `expression` sur la configuration `config`.'''
+    namespace = dict((name, UnitParams(params)) for name, params in config.funits.items())
+    namespace['Core'] = UnitParams({'rob_size': config.rob_size,
+        'registers': config.num_registers, 'recovery': config.recovery,
+        'issue_width': config.issue_width, 'commit_width': config.commit_width,
+        'cdb_buses': config.cdb_buses, 'disambiguation': config.disambiguation,
+        'store_set_bits': config.store_set_bits, 'vector_registers': config.vector_registers,
+        'vector_length': config.vector_length})
+    return float(eval(expression, {}, namespace))
+
+
+def init_worker(bound):
+    global _bound
+    _bound = bound
+    sweep.init_worker()
+
+
+def simulate(job):
+    '''
+    Simule un point de l'espace de recherche. Retourne (point, cycles, borne); cycles vaut None
+     si la simulation a été abandonnée ou a échoué. Dans le premier cas, borne est la borne de
+     cycles dépassée, dans le second None.
+    '''
+    point, description, config, source_file, stall_limit = job
+    simulator = sim.Simulator(config, sweep.load_program(source_file))
+    try:
+        while simulator.step() == 0:
+            simulator.clock += 1
+            bound = _bound.value
+            if simulator.clock > bound:
+                return point, None, bound
+            if stall_limit is not None and simulator.clock - simulator.last_progress > \
+              stall_limit:
+                sys.stderr.write('%s: aucun progrès depuis %i coups d\'horloge.\n' %
+                    (description, stall_limit))
+                return point, None, None
+    except Exception as e:
+        sys.stderr.write('%s: %s\n' % (description, e))
+        return point, None, None
+    return point, simulator.clock, None
+
+
+class Search(object):
+    '''
+    Montée de colline sur une grille de paramètres `grid` (liste de tuples (clé, [valeurs])).
+     Un point de l'espace est un tuple d'indices dans les listes de valeurs.
+    '''
+    def __init__(self, config_file, source_file, grid, cost, budget=None, target_cycles=None,
+      processes=None, max_cycles=MAX_CYCLES, stall_limit=None):
+        self.config = sim.read_config(config_file)
+        self.source_file = source_file
+        self.grid = grid
+        self.cost_expression = cost
+        self.budget = budget
+        self.target_cycles = target_cycles
+        self.max_cycles = max_cycles
+        self.stall_limit = stall_limit
+
+        #Résultats de chaque point évalué: {point: (coût, cycles)}
+        self.results = {}
+        #Pour les points dont la simulation a été abandonnée: borne de cycles dépassée (infinie
+        #si la simulation a échoué). Un tel point est resimulé si la borne devient plus grande.
+        self.exceeded = {}
+        self.best = None
+        self.simulations = 0
+        self.aborted = 0
+
+        #Avant le premier résultat, seul `max_cycles` borne les simulations.
+        self.bound = multiprocessing.Value('l', max_cycles, lock=False)
+        self.pool = multiprocessing.Pool(processes, initializer=init_worker,
+            initargs=(self.bound,))
+
+    def point_config(self, point):
+        config = self.config.copy()
+        for (key, values), i in zip(self.grid, point):
+            config.set(key, values[i])
+        return config
+
+    def describe(self, point):
+        return sweep.format_overrides([(key, values[i]) for (key, values), i in
+            zip(self.grid, point)])
+
+    def is_better(self, a, b):
+        '''Vrai si le résultat `a` (coût, cycles) est meilleur que `b`.'''
+        if b is None or b[1] is None:
+            return a[1] is not None
+        if a[1] is None:
+            return False
+        if self.target_cycles is not None:
+            a_ok = a[1] <= self.target_cycles
+            b_ok = b[1] <= self.target_cycles
+            if a_ok != b_ok:
+                return a_ok
+            if a_ok:
+                return (a[0], a[1]) < (b[0], b[1])
+        return (a[1], a[0]) < (b[1], b[0])
+
+    def cycle_bound(self, reference):
+        '''
+        Nombre de cycles au-delà duquel une simulation ne peut plus être meilleure que le
+         résultat `reference` (coût, cycles), ou None.
+        '''
+        if reference is None or reference[1] is None:
+            return self.max_cycles
+        if self.target_cycles is not None and reference[1] <= self.target_cycles:
+            return min(self.target_cycles, self.max_cycles)
+        return min(reference[1], self.max_cycles)
+
+    def can_improve(self, cost, reference):
+        '''Vrai si un point de coût `cost` peut être meilleur que le résultat `reference`.'''
+        if self.budget is not None and cost > self.budget:
+            return False
+        if self.target_cycles is not None and reference is not None and \
+          reference[1] is not None and reference[1] <= self.target_cycles and \
+          cost > reference[0]:
+            return False
+        return True
+
+    def evaluate(self, points, reference=None):
+        '''
+        Évalue en parallèle ceux des points de `points` qui peuvent être meilleurs que le
+         résultat `reference` (coût, cycles), e.g. celui du point courant d'une montée. Les
+         points déjà simulés ne le sont pas à nouveau, sauf si leur simulation a été abandonnée
+         sous une borne plus petite que celle de `reference`.
+        '''
+        bound = self.cycle_bound(reference)
+        jobs = []
+        for point in points:
+            if point in self.results:
+                cost, cycles = self.results[point]
+                if cycles is not None or self.exceeded.get(point, -1) >= bound:
+                    continue
+            else:
+                cost = hardware_cost(self.point_config(point), self.cost_expression)
+                self.results[point] = (cost, None)
+            if self.can_improve(cost, reference):
+                jobs.append((point, self.describe(point), self.point_config(point),
+                    self.source_file, self.stall_limit))
+
+        self.bound.value = bound
+        for point, cycles, exceeded in self.pool.imap_unordered(simulate, jobs):
+            self.simulations += 1
+            cost = self.results[point][0]
+            self.results[point] = (cost, cycles)
+            if cycles is None:
+                self.aborted += 1
+                self.exceeded[point] = exceeded if exceeded is not None else float('inf')
+                continue
+            print('%s: coût %g, %i cycles' % (self.describe(point), cost, cycles))
+            if self.is_better((cost, cycles), self.best):
+                self.best = (cost, cycles)
+                self.best_point = point
+            #Seul le meilleur des points évalués compte: les autres peuvent être abandonnés
+            #dès qu'ils font pire.
+            if self.is_better((cost, cycles), reference):
+                reference = (cost, cycles)
+                self.bound.value = self.cycle_bound(reference)
+
+    def neighbours(self, point):
+        '''Points obtenus en changeant un paramètre pour la valeur voisine.'''
+        result = []
+        for k, (_, values) in enumerate(self.grid):
+            for step in [-1, 1]:
+                i = point[k] + step
+                if 0 <= i < len(values):
+                    result.append(point[:k] + (i,) + point[k + 1:])
+        return result
+
+    def climb(self, start):
+        '''
+        Montée de colline à partir de `start`: on passe au meilleur voisin du point courant
+         tant qu'il est meilleur que celui-ci, indépendamment des résultats des autres montées.
+        '''
+        current = start
+        self.evaluate([current])
+        while self.results[current][1] is not None:
+            neighbours = self.neighbours(current)
+            self.evaluate(neighbours, self.results[current])
+            best = current
+            for point in neighbours:
+                if self.is_better(self.results[point], self.results[best]):
+                    best = point
+            if best == current:
+                return
+            current = best
+
+    def run(self, restarts=0, seed=0):
+        '''
+        Lance la recherche à partir de la configuration initiale, puis de `restarts` points
+         aléatoires.
+        '''
+        #Point de départ: les valeurs de la configuration, si elles font partie de la grille.
+        start = []
+        for key, values in self.grid:
+            current = self.config.get(key)
+            start.append(values.index(current) if current in values else 0)
+
+        rand = random.Random(seed)
+        starts = [tuple(start)] + [tuple(rand.randrange(len(values)) for _, values in
+            self.grid) for _ in range(restarts)]
+        try:
+            for s in starts:
+                self.climb(s)
+        finally:
+            self.pool.terminate()
+            self.pool.join()
+        return self.best
+
+
+def main(config_file, source_file, grid, cost, budget, target_cycles, restarts, processes,
+  max_cycles=MAX_CYCLES, stall_limit=None):
+    search = Search(config_file, source_file, grid, cost, budget, target_cycles, processes,
+        max_cycles, stall_limit)
+    best = search.run(restarts)
+
+    grid_size = 1
+    for _, values in grid:
+        grid_size *= len(values)
+    print('%i simulations (dont %i abandonnées) pour une grille de %i points.' %
+        (search.simulations, search.aborted, grid_size))
+
+    if best is None or (target_cycles is not None and best[1] > target_cycles):
+        print('Aucune configuration ne satisfait les contraintes.')
+        return 1
+    print('Meilleure configuration: %s (coût %g, %i cycles)' %
+        (search.describe(search.best_point), best[0], best[1]))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recherche la meilleure configuration des \
+unités fonctionnelles sous contrainte de coût matériel ou de nombre de cycles.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('config_file', help='Fichier xml de configuration de départ.')
+    parser.add_argument('source_file', help='Fichier contenant le code source à exécuter.')
+    parser.add_argument('-p', dest='grid', action='append', type=sweep.parse_override,
+        required=True, help='Valeurs possibles d\'un paramètre, e.g. Mult.latency=2,4,8. \
+Peut être répété.')
+    parser.add_argument('--cost', default='sum([Load.number, Store.number, Add.number, \
+Mult.number, ALU.number, Branch.number])', help='Expression du coût matériel.')
+    parser.add_argument('--budget', type=float, default=None, help='Coût matériel maximal.')
+    parser.add_argument('--target-cycles', type=int, default=None, help='Nombre de cycles \
+visé: on cherche alors la configuration la moins coûteuse qui l\'atteint.')
+    parser.add_argument('--restarts', type=int, default=0, help='Nombre de redémarrages \
+aléatoires de la montée de colline.')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+        help='Nombre de processus (par défaut, le nombre de processeurs).')
+    parser.add_argument('--max-cycles', type=int, default=MAX_CYCLES, help="Nombre maximal de \
+coups d'horloge d'une simulation.")
+    parser.add_argument('--stall-limit', type=int, default=None, help="Abandonne une \
+simulation après ce nombre de coups d'horloge consécutifs sans progrès.")
+
+    args = parser.parse_args()
+
+    sys.exit(main(args.config_file, args.source_file, args.grid, args.cost, args.budget,
+        args.target_cycles, args.restarts, args.processes, args.max_cycles, args.stall_limit))
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Serveur local de simulations (Python 3.7+).
+
+Le serveur écoute sur un socket Unix (ou un port TCP local) et répartit les simulations reçues
+ sur un bassin de processus démarrés à l'avance, dans lesquels les modules du simulateur sont
+ déjà importés. On évite ainsi de payer le démarrage de l'interpréteur et les imports à chaque
+ simulation. Voir `client.py` pour le client.
+
+Protocole: une requête JSON par ligne, de la forme {"id": ..., "args": {...}} où "args"
+ contient les arguments de `mipssim.py` (voir `cli.make_parser`). Pour chaque requête, le serveur
+ répond dès que la simulation est terminée par une ligne {"id": ..., "exit_code": ...,
+ "output": ...}, "output" étant ce que `mipssim.py` aurait affiché. Plusieurs requêtes peuvent
+ être envoyées sur la même connexion; les réponses arrivent dans l'ordre où les simulations se
+ terminent.
+'''
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import time
+import traceback
+
+#local imports
+import mipssim
+import simulator as sim
+
+default_socket = os.path.join(tempfile.gettempdir(), 'mipssim-%i.sock' % os.getuid())
+
+
+def run_job(args):
+    '''
+    Exécute une simulation comme le ferait `mipssim.py` et retourne son code de retour et ce
+     qui a été affiché.
+    '''
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            err, simulator = mipssim.main_from_args(argparse.Namespace(**args))
+            #Ferme les fichiers de trace.
+            del simulator
+        except Exception:
+            traceback.print_exc(file=output)
+            err = sim.ExitCode.UNEXPECTED_ERROR
+    return err, output.getvalue()
+
+
+def error_response(request_id, message):
+    '''Réponse (ligne JSON encodée) signalant une requête qui n'a pas pu être simulée.'''
+    return json.dumps({'id': request_id, 'exit_code': sim.ExitCode.UNEXPECTED_ERROR,
+        'output': message + '\n'}).encode() + b'\n'
+
+
+def remove_stale_socket(socket_path):
+    '''
+    Supprime le socket Unix `socket_path` laissé par un serveur arrêté. Échoue si un serveur y
+     répond encore ou si le fichier n'est pas un socket.
+    '''
+    if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        raise Exception('%s existe et n\'est pas un socket.' % socket_path)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        #Personne n'écoute: socket orphelin.
+        pass
+    else:
+        raise Exception('Un serveur écoute déjà sur %s.' % socket_path)
+    finally:
+        client.close()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+
+def wait_worker(delay):
+    '''Tâche vide servant à démarrer tous les processus du bassin.'''
+    time.sleep(delay)
+    return os.getpid()
+
+
+class JobServer(object):
+    '''
+    Répartit les simulations reçues sur `processes` processus.
+    '''
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count()
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.processes)
+        #Socket Unix créé par ce serveur, à supprimer à son arrêt.
+        self.socket_path = None
+
+    def warm_up(self):
+        '''Démarre tous les processus du bassin avant de recevoir des simulations.'''
+        futures = [self.pool.submit(wait_worker, 0.1) for _ in range(self.processes)]
+        pids = set(f.result() for f in futures)
+        print('%i processus prêts.' % len(pids))
+
+    async def handle_client(self, reader, writer):
+        '''Traite les requêtes d'une connexion.'''
+        pending = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line.decode())
+            except ValueError:
+                writer.write(error_response(None, 'Requête invalide.'))
+                continue
+            if not isinstance(request, dict) or not isinstance(request.get('args'), dict):
+                request_id = request.get('id') if isinstance(request, dict) else None
+                writer.write(error_response(request_id, 'Requête invalide: "args" doit être un '
+                    'objet contenant les arguments de mipssim.py.'))
+                continue
+            pending.add(asyncio.ensure_future(self.run(request, writer)))
+
+        if pending:
+            await asyncio.wait(pending)
+        writer.close()
+
+    async def run(self, request, writer):
+        '''Simule une requête dans le bassin et écrit la réponse.'''
+        loop = asyncio.get_event_loop()
+        try:
+            err, output = await loop.run_in_executor(self.pool, run_job, request['args'])
+            response = json.dumps({'id': request.get('id'), 'exit_code': err,
+                'output': output}).encode() + b'\n'
+        except Exception as e:
+            #Le client attend une réponse pour chaque requête, même si le bassin a échoué.
+            response = error_response(request.get('id'), '%s: %s' % (type(e).__name__, e))
+        writer.write(response)
+        await writer.drain()
+
+    async def serve(self, socket_path=None, port=None):
+        if port is not None:
+            server = await asyncio.start_server(self.handle_client, '127.0.0.1', port)
+            print('En attente de simulations sur 127.0.0.1:%i.' % port)
+        else:
+            if os.path.exists(socket_path):
+                remove_stale_socket(socket_path)
+            server = await asyncio.start_unix_server(self.handle_client, socket_path)
+            self.socket_path = socket_path
+            print('En attente de simulations sur %s.' % socket_path)
+        sys.stdout.flush()
+        async with server:
+            await server.serve_forever()
+
+
+def main(socket_path, port, processes):
+    job_server = JobServer(processes)
+    job_server.warm_up()
+    try:
+        asyncio.run(job_server.serve(socket_path, port))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+    finally:
+        job_server.pool.shutdown()
+        if job_server.socket_path is not None and os.path.exists(job_server.socket_path):
+            os.remove(job_server.socket_path)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serveur local de simulations. Voir \
+client.py pour lui soumettre des simulations.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--socket', dest='socket_path', default=default_socket,
+        help='Socket Unix sur lequel écouter.')
+    parser.add_argument('--port', type=int, default=None, help='Écouter plutôt sur ce port \
+TCP (127.0.0.1 seulement).')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+        help='Nombre de processus (par défaut, le nombre de processeurs).')
+
+    args = parser.parse_args()
+
+    sys.exit(main(args.socket_path, args.port, args.processes))
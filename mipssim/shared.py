@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Publication de programmes décodés et d'images mémoire initiales en mémoire partagée
+ (`multiprocessing.shared_memory`, Python 3.8+).
+
+Le processus parent publie une fois le programme et la mémoire initiale; les processus de
+ travail s'y attachent sans copie à partir d'un descripteur (picklable) et ne conservent que
+ les mots qu'ils modifient (`components.OverlayMemory`).
+
+Format d'une image mémoire de n mots: n valeurs de 8 octets (entier signé ou flottant double)
+ suivies de n octets donnant le type de chaque mot (0 = flottant, 1 = entier).
+'''
+
+import pickle
+import sys
+from multiprocessing import shared_memory
+
+#local imports
+import components
+
+FLOAT_WORD, INT_WORD = range(0, 2)
+#Intervalle des entiers représentables dans une image (entiers signés de 64 bits).
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+#Blocs et images déjà attachés par le processus courant, par nom de bloc.
+_attached = {}
+
+
+def attach_block(name):
+    '''Attache le bloc de mémoire partagée `name`, une seule fois par processus.'''
+    if name not in _attached:
+        try:
+            #Le bloc appartient au parent: il ne doit pas être effacé à la fin du processus.
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            #Python < 3.13
+            block = shared_memory.SharedMemory(name=name)
+        _attached[name] = [block, None]
+    return _attached[name]
+
+
+class MemoryImage(object):
+    '''
+    Vue sur une image mémoire en mémoire partagée. S'utilise comme une liste de mots (entiers
+     ou flottants). Les simulateurs de `sweep.py` n'y écrivent jamais; ceux de `multicore.py`
+     y publient leurs écritures (voir `components.OverlayMemory.flush`).
+    '''
+    def __init__(self, block, size):
+        self.block = block
+        self.size = size
+        self.ints = block.buf[:8 * size].cast('q')
+        self.floats = block.buf[:8 * size].cast('d')
+        self.types = block.buf[8 * size:9 * size]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if self.types[i] == INT_WORD:
+            return self.ints[i]
+        return self.floats[i]
+
+    def __setitem__(self, i, value):
+        if isinstance(value, float):
+            self.floats[i] = value
+            self.types[i] = FLOAT_WORD
+        else:
+            if not INT_MIN <= value <= INT_MAX:
+                raise components.ProgramError('Le mot %i (adresse %i) ne peut pas être '
+                    'publié en mémoire partagée: l\'entier %i ne tient pas sur 64 bits.' %
+                    (i, 8 * i, value))
+            self.ints[i] = value
+            self.types[i] = INT_WORD
+
+    def release(self):
+        '''Libère les vues sur le bloc (requis avant de le fermer).'''
+        self.ints.release()
+        self.floats.release()
+        self.types.release()
+
+
+class SharedImages(object):
+    '''
+    Programmes et images mémoire publiés par le processus parent. Utiliser `close` (ou un bloc
+     `with`) pour effacer les blocs une fois les processus de travail terminés.
+    '''
+    def __init__(self):
+        self.blocks = []
+
+    def publish_program(self, instructions):
+        '''Publie un programme décodé et retourne son descripteur.'''
+        data = pickle.dumps(instructions, pickle.HIGHEST_PROTOCOL)
+        block = shared_memory.SharedMemory(create=True, size=len(data))
+        block.buf[:len(data)] = data
+        self.blocks.append(block)
+        return ('program', block.name, len(data))
+
+    def publish_memory(self, memory):
+        '''Publie le contenu de `memory` (`components.Memory`) et retourne son descripteur.'''
+        size = len(memory)
+        #Un bloc ne peut pas être vide.
+        block = shared_memory.SharedMemory(create=True, size=max(1, 9 * size))
+        memory.write_image(block.buf)
+        self.blocks.append(block)
+        return ('memory', block.name, size)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach_program(descriptor):
+    '''Retourne le programme décodé publié sous `descriptor`.'''
+    _, name, size = descriptor
+    entry = attach_block(name)
+    if entry[1] is None:
+        #Les instructions sont de petits objets Python: on les décode une fois par processus.
+        entry[1] = pickle.loads(entry[0].buf[:size])
+    return entry[1]
+
+
+def attach_memory(descriptor):
+    '''
+    Retourne une nouvelle mémoire (`components.OverlayMemory`) dont le contenu initial est
+     l'image publiée sous `descriptor`, sans la copier.
+    '''
+    _, name, size = descriptor
+    entry = attach_block(name)
+    if entry[1] is None:
+        entry[1] = MemoryImage(entry[0], size)
+    return components.OverlayMemory(entry[1])
+
+
+if __name__ == '__main__':
+    sys.stderr.write('Ce module n\'est pas utilisable seul.')
+    sys.exit(-1)
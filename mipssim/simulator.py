@@ -7,19 +7,31 @@
 #  the top-level directory of this project and at
 #  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
 
+import copy
+import hashlib
 import sys
+import time
+import traceback
 
 from collections import OrderedDict, deque
 from xml.dom.minidom import parse
 
 #local imports
+import cache
 import trace
+import vector
 import interpreter as interp
 from interpreter import memory_re
 import components
 from components import State
 
 
+#Enumération des codes de retour de `Simulator.go`
+class ExitCode:
+    SUCCESS, PROGRAM_ERROR, UNEXPECTED_ERROR, CYCLE_BUDGET, INSTRUCTION_BUDGET, TIME_BUDGET,\
+     INFINITE_LOOP, DEADLOCK = range(0, 8)
+
+
 class Simulator:
     '''
     Simulateur d'exécution du MIPS.
@@ -27,23 +39,41 @@ class Simulator:
     Prends le code retourné par l'interpreteur et l'exécute sur la
     configuration entrée.
     '''
-    def __init__(self, config_file, source_file, trace_file='', latex_trace_file='', debug=False):
+    def __init__(self, config_file, source_file, trace_file='', latex_trace_file='', debug=False,
+      memory=None):
         #Initialisation des variables membres
         self.clock = 1
         self.stall = False
         self.new_PC = None
-        self.ROB = components.ROB(maxlen=24)
         self.PC = -1 #Puisqu'on incrémente avant le premier lancement
         self.RS = OrderedDict()
+        #Unités fonctionnelles attendant le résultat de chaque entrée du ROB:
+        #{indice de l'entrée: [unités]}. Voir `writeback_tomasulo`.
+        self.waiters = {}
 
         self.debug = debug
 
-        #Initialisation des registres
-        self.regs = components.Registers()
+        #Nombre d'instructions sanctionnées
+        self.committed = 0
+        #Empreintes de l'état architectural prises aux branchements arrière pour détecter les
+        #boucles infinies (None si la détection est désactivée).
+        self.fingerprints = None
+        #Empreinte des écritures en mémoire, voir `record_store`.
+        self.mem_digest = 0
+        #Raison de l'arrêt de la simulation si celle-ci a été interrompue.
+        self.abort_reason = None
+        #Dernier coup d'horloge où une instruction a été lancée, écrite ou sanctionnée.
+        self.last_progress = self.clock
 
         #Lecture de la configuration et du code source à exécuter
-        self.load_config(config_file)
-        self.instructions = interp.interpret_asm(source_file)
+        self.load_config(config_file, memory)
+        if isinstance(source_file, list):
+            #Programme déjà décodé, e.g. partagé entre plusieurs simulations.
+            self.instructions = source_file
+        else:
+            self.instructions = interp.interpret_asm(source_file)
+        #Valeurs initiales des registres, voir `reset`.
+        self.initial_regs = list(self.regs.items())
 
         #Setup du fichier de trace si applicable
         self.trace = []
@@ -52,24 +82,260 @@ class Simulator:
         if latex_trace_file:
             self.trace.append(trace.LaTeXTrace(latex_trace_file))
 
-    def go(self):
+    @classmethod
+    def from_source(cls, config, source, **kwargs):
+        '''
+        Construit un simulateur à partir d'une configuration (nom de fichier ou objet
+         `Configuration`) et du code source assembleur `source`, une chaîne de caractères.
+         Les autres paramètres sont ceux du constructeur.
+        '''
+        return cls(config, interp.interpret_source(source), **kwargs)
+
+    def reset(self):
+        '''
+        Remet le simulateur dans son état initial pour exécuter à nouveau le programme: les
+         registres et la mémoire reprennent leurs valeurs initiales, le ROB et les stations de
+         réservation sont vidés sur place. Beaucoup moins coûteux que de construire un nouveau
+         simulateur.
+        '''
+        self.clock = 1
+        self.stall = False
+        self.new_PC = None
+        self.PC = -1
+        self.committed = 0
+        self.fingerprints = None
+        self.mem_digest = 0
+        self.abort_reason = None
+        self.last_progress = self.clock
+        self.waiters = {}
+        self.vector_done = {}
+        self.third_waiters = {}
+
+        self.ROB.reset()
+        self.reset_funits()
+        self.reset_pipelines()
+        self.cdb_stats = dict.fromkeys(self.cdb_stats, 0)
+        self.mem_stats = dict.fromkeys(self.mem_stats, 0)
+        self.store_sets.reset()
+        for funits in self.RS.values():
+            for funit in funits:
+                if hasattr(funit, 'reset_model'):
+                    funit.reset_model()
+        self.regs.restore(self.initial_regs)
+        self.mem.reset()
+        if self.cache is not None:
+            self.cache.reset()
+
+    def fork(self):
+        '''
+        Retourne une copie indépendante du simulateur dans son état courant, pour explorer une
+         autre suite de l'exécution. Le programme est partagé et la mémoire est copiée par
+         `snapshot` (O(1) avec une `components.PagedMemory`). La copie n'écrit pas de trace.
+        '''
+        memo = {id(self.mem): self.mem.snapshot(), id(self.instructions): self.instructions,
+            id(self.trace): []}
+        for instr in self.instructions:
+            memo[id(instr)] = instr
+        return copy.deepcopy(self, memo)
+
+    def state_digest(self):
+        '''
+        Retourne une empreinte (hexadécimale) de l'état architectural courant, soit le contenu
+         des registres et de la mémoire.
+        '''
+        return hashlib.sha1((self.regs.digest() + self.mem.digest()).encode()).hexdigest()
+
+    def go(self, max_cycles=None, max_instructions=None, max_time=None, detect_loops=False,
+      stall_limit=None):
         '''
         Effectue la simulation
 
-        Valeurs de retour:
+        Paramètres:
+        -----------
+        max_cycles: nombre maximal de coups d'horloge.
+        max_instructions: nombre maximal d'instructions sanctionnées.
+        max_time: temps d'exécution maximal (en secondes).
+        detect_loops: si vrai, une empreinte de l'état architectural (PC, registres et
+         mémoire) est prise à chaque branchement arrière sanctionné. Retrouver une empreinte
+         déjà vue signifie que le programme boucle indéfiniment.
+        stall_limit: nombre maximal de coups d'horloge consécutifs sans qu'aucune instruction ne
+         soit lancée, écrite (writeback) ou sanctionnée. Si atteint, l'état du ROB, des stations
+         de réservation et des registres est affiché.
+
+        Valeurs de retour (voir `ExitCode`):
 
         * 0 = Simulation terminée avec succès
-        * 1 = Une erreur a été détectée lors de l'exécution du programme. Pour
-              plus de détails, voir le flot d'erreur du programme.
-        * 2 = Une erreur non-prévue s'est produite.
+        * 1 = Une erreur a été détectée lors de l'exécution du programme (accès mémoire
+              invalide, longueur de vecteur invalide, etc.), voir `abort_reason`.
+        * 2 = Une erreur non-prévue s'est produite dans le simulateur.
+        * 3 = Le nombre maximal de coups d'horloge a été atteint.
+        * 4 = Le nombre maximal d'instructions sanctionnées a été atteint.
+        * 5 = Le temps d'exécution maximal a été atteint.
+        * 6 = Une boucle infinie a été détectée.
+        * 7 = Le simulateur est bloqué (aucun progrès depuis `stall_limit` coups d'horloge).
         '''
+        if detect_loops:
+            self.fingerprints = set()
+        if max_time is not None:
+            deadline = time.time() + max_time
 
-        while self.step() == 0:
-            self.clock += 1
+        try:
+            while self.step() == 0:
+                self.clock += 1
+
+                if self.abort_reason is not None:
+                    #Boucle infinie détectée lors du sanctionnement d'un branchement.
+                    return self.abort(ExitCode.INFINITE_LOOP, self.abort_reason)
+                if max_cycles is not None and self.clock > max_cycles:
+                    return self.abort(ExitCode.CYCLE_BUDGET,
+                        'Nombre maximal de coups d\'horloge atteint (%i).' % max_cycles)
+                if max_instructions is not None and self.committed >= max_instructions:
+                    return self.abort(ExitCode.INSTRUCTION_BUDGET,
+                        'Nombre maximal d\'instructions sanctionnées atteint (%i).' % max_instructions)
+                if stall_limit is not None and self.clock - self.last_progress > stall_limit:
+                    print(self.dump_state())
+                    return self.abort(ExitCode.DEADLOCK, 'Aucun progrès depuis %i coups d\'horloge '
+                        '(dernier au coup d\'horloge %i).' % (stall_limit, self.last_progress))
+                #Vérifier l'heure a un coût, on ne le fait que périodiquement.
+                if max_time is not None and self.clock % 256 == 0 and time.time() > deadline:
+                    return self.abort(ExitCode.TIME_BUDGET,
+                        'Temps d\'exécution maximal atteint (%g s).' % max_time)
+        except components.ProgramError as e:
+            return self.abort(ExitCode.PROGRAM_ERROR, str(e))
+        except Exception as e:
+            #Erreur du simulateur lui-même.
+            traceback.print_exc()
+            return self.abort(ExitCode.UNEXPECTED_ERROR, '%s: %s' % (type(e).__name__, e))
 
         #L'exécution s'est complétée sans problème.
         print("Simulation terminée au coup d'horloge %i." % self.clock)
-        return 0
+        return ExitCode.SUCCESS
+
+    def iter_cycles(self, components=('rob', 'rs', 'regs')):
+        '''
+        Effectue la simulation en retournant (générateur) un `trace.CycleSnapshot` à la fin de
+         chaque coup d'horloge. Seules les composantes nommées dans `components` (parmi
+         `trace.snapshot_components`: 'rob', 'rs', 'regs', 'mem') sont capturées; les autres ne
+         coûtent rien. La simulation s'arrête avec le générateur, e.g.:
+
+            for snapshot in simulator.iter_cycles(['rob']):
+                if len(snapshot.rob) == simulator.ROB.maxlen:
+                    print('ROB plein au coup d\'horloge %i' % snapshot.clock)
+        '''
+        for c in components:
+            if c not in trace.snapshot_components:
+                raise Exception('Composante inconnue: %s (choix: %s).' % (c,
+                    ', '.join(trace.snapshot_components)))
+        components = tuple(components)
+
+        while True:
+            done = self.step()
+            yield trace.CycleSnapshot(self, components)
+            if done:
+                return
+            self.clock += 1
+
+    def abort(self, exit_code, reason):
+        '''Interrompt la simulation pour la raison `reason` et retourne `exit_code`.'''
+        self.abort_reason = reason
+        print('Simulation interrompue au coup d\'horloge %i: %s' % (self.clock, reason))
+        return exit_code
+
+    def dump_state(self):
+        '''
+        Retourne une description compacte du ROB, des stations de réservation et de la table de
+         renommage des registres, en expliquant ce que chaque entrée attend.
+        '''
+        funits = dict((f.name, f) for units in self.RS.values() for f in units)
+        lines = ['État du simulateur au coup d\'horloge %i (PC: %i):' % (self.clock, self.PC)]
+
+        if self.PC + 1 < len(self.instructions) or self.new_PC is not None:
+            next_PC = self.new_PC if self.new_PC is not None else self.PC + 1
+            if next_PC < len(self.instructions):
+                next_instr = self.instructions[next_PC]
+                if not self.ROB.check_free_entry():
+                    reason = 'ROB plein'
+                elif self.find_funit(self.RS[next_instr.funit_type], next_instr.funit_type) < 0:
+                    reason = 'aucune unité %s libre' % next_instr.funit_type
+                else:
+                    reason = 'aucun blocage'
+                lines.append('Lancement de %i (%s): %s' % (next_PC, next_instr.code, reason))
+
+        lines.append('ROB (%i entrées):' % len(self.ROB))
+        for e in self.ROB:
+            funit = funits.get(e.funit)
+            if funit is not None and (not funit.busy or funit.dest != e.i):
+                funit = None
+            lines.append('  #%i %s %s [%s]: %s' % (e.i + 1, e.instr.code,
+                ','.join(e.instr.operands), trace.rob_states[e.state],
+                self.waiting_reason(e, funit)))
+
+        lines.append('Stations de réservation occupées:')
+        for f in funits.values():
+            if f.busy:
+                lines.append('  %s: %s, dest #%s, time %s, qj %s, qk %s' % (f.name,
+                    f.instr.code, f.dest + 1, f.time, '#%i' % (f.qj + 1) if f.qj is not None
+                    else '-', '#%i' % (f.qk + 1) if f.qk is not None else '-'))
+
+        renamed = ['%s->#%i' % (r, i + 1) for r, i in self.regs.stat.items() if i is not None]
+        lines.append('Renommage: %s' % (', '.join(renamed) if renamed else 'aucun'))
+        return '\n'.join(lines)
+
+    def waiting_reason(self, rob_entry, funit):
+        '''Explique ce qu'attend l'entrée `rob_entry` du ROB, exécutée par `funit`.'''
+        if rob_entry.state == State.COMMIT:
+            return 'sanctionnée'
+        if rob_entry.state == State.WRITE:
+            if rob_entry is self.ROB[self.ROB.start]:
+                return 'prête à être sanctionnée'
+            return 'attend les instructions précédentes pour être sanctionnée'
+        if funit is None:
+            return 'aucune unité fonctionnelle associée'
+
+        waiting = ['#%i' % (q + 1) for q in [funit.qj, funit.qk] if q is not None]
+        if funit.time is None:
+            if len(waiting) > 0:
+                return 'attend les opérandes de %s' % ', '.join(waiting)
+            if rob_entry.instr.funit_type == 'Load':
+                for e in self.ROB:
+                    if e.i == rob_entry.i:
+                        break
+                    if e.instr.funit_type == 'Store' and (e.addr is None or e.addr == funit.A):
+                        return 'attend le Store #%i (adresse %s)' % (e.i + 1,
+                            'inconnue' if e.addr is None else 'identique')
+            pipeline = self.pipelines.get(rob_entry.instr.funit_type)
+            if pipeline is not None and min(pipeline[1]) > self.clock:
+                return 'attend un pipeline libre'
+            return 'en attente de démarrage'
+        if funit.time >= 1:
+            return 'en exécution (%i coups d\'horloge restants)' % funit.time
+        if len(waiting) > 0:
+            return 'exécution terminée, attend la valeur de %s pour l\'écriture' % \
+                ', '.join(waiting)
+        return 'exécution terminée, attend l\'écriture'
+
+    def record_store(self, addr, value):
+        '''
+        Met à jour l'empreinte de la mémoire avant l'écriture de `value` à l'adresse `addr`.
+         L'empreinte est le ou exclusif des empreintes de chaque mot différent de sa valeur
+         initiale, elle ne dépend donc que du contenu de la mémoire et non de l'ordre des
+         écritures.
+        '''
+        old = self.mem[addr]
+        self.mem_digest ^= hash((addr, type(old).__name__, old)) ^ \
+            hash((addr, type(value).__name__, value))
+
+    def check_loop(self, target):
+        '''
+        Appelée lorsqu'un branchement arrière vers `target` est sanctionné. Compare l'état
+         architectural aux états déjà rencontrés.
+        '''
+        fingerprint = hash((target, self.regs.fingerprint(), self.mem_digest))
+        if fingerprint in self.fingerprints:
+            self.abort_reason = ('Boucle infinie détectée au coup d\'horloge %i: l\'état '
+                'architectural au branchement vers %i est identique à un état antérieur.' %
+                (self.clock, target))
+        self.fingerprints.add(fingerprint)
 
     def step(self):
         '''
@@ -89,22 +355,33 @@ class Simulator:
         #Décrémentation du temps sur les unités fonctionnelles
         self.decrement_time()
 
-        # Gestion des bulles et de la fin du programme
-        if self.stall == True or (self.new_PC == None and self.PC + 1 == len(self.instructions)):
-            print('Aucune instruction lancée (clock: %i).' % self.clock)
-        elif self.new_PC == len(self.instructions):
-            #Le programme va terminer son exécution dès que le ROB sera vide.
-            self.PC = self.new_PC
-        else:
-            #Avancement du Issue/Program Counter (PC)
-            if self.new_PC != None: #Si branchement
+        #Lancement d'au plus `issue_width` instructions, dans l'ordre du programme.
+        for slot in range(self.issue_width):
+            # Gestion des bulles et de la fin du programme
+            if self.stall == True or (self.new_PC == None and
+              self.PC + 1 == len(self.instructions)):
+                if slot == 0:
+                    print('Aucune instruction lancée (clock: %i).' % self.clock)
+                break
+            elif self.new_PC == len(self.instructions):
+                #Le programme va terminer son exécution dès que le ROB sera vide.
                 self.PC = self.new_PC
+                break
             else:
-                self.PC = self.PC + 1
-            self.new_PC = None
+                #Avancement du Issue/Program Counter (PC)
+                if self.new_PC != None: #Si branchement
+                    self.PC = self.new_PC
+                else:
+                    self.PC = self.PC + 1
+                self.new_PC = None
+
+                #Lance l'instruction à self.PC
+                self.issue()
 
-            #Lance l'instruction à self.PC
-            self.issue()
+                #Le groupe s'arrête à un blocage structurel (l'instruction sera relancée au
+                #prochain coup d'horloge) ou à un branchement prédit pris.
+                if self.new_PC != None:
+                    break
 
         #Mise à jour de la trace
         for t in self.trace:
@@ -119,19 +396,27 @@ class Simulator:
     def commit(self):
         '''
         Sanctionne les opérations dont le calcul est terminé dans l'ordre de lancement.
-        Seule l'instruction à la tête du ROB peut être sanctionnée.
+        Jusqu'à `commit_width` instructions peuvent être sanctionnées par coup d'horloge, à
+         partir de la tête du ROB.
         '''
-        rob_head = self.ROB[self.ROB.start]
-
-        #Petit hack pour pouvoir visualiser la dernière entrée à avoir été sanctionnée
-        if rob_head.state == State.COMMIT:
+        #Petit hack pour pouvoir visualiser les dernières entrées à avoir été sanctionnées
+        while len(self.ROB) > 0 and self.ROB[self.ROB.start].state == State.COMMIT:
             self.ROB.free_head_entry()
-            rob_head = self.ROB[self.ROB.start]
 
-        if len(self.ROB) > 0 and rob_head.state == State.WRITE and rob_head.ready:
+        i = self.ROB.start
+        for _ in range(min(self.commit_width, len(self.ROB))):
+            rob_head = self.ROB[i]
+            if rob_head.state != State.WRITE or not rob_head.ready:
+                break
+
             if self.debug:
                 print('Sanctionnement: %s' % rob_head)
 
+            #Type de la valeur d'un Load spéculatif, vérifié maintenant qu'il est certain.
+            if self.disambiguation == 'speculative' and rob_head.instr.funit_type == 'Load':
+                components.check_load_type(rob_head.value,
+                    'float' if rob_head.instr.code == 'L.D' else 'int')
+
             if rob_head.dest != None:
                 self.regs[rob_head.dest] = rob_head.value
                 #Si cette instruction était la seule (ou la dernière) à devoir écrire dans le ROB,
@@ -139,39 +424,166 @@ class Simulator:
                 if self.regs.stat[rob_head.dest] != None:
                      dest_i = self.regs.stat[rob_head.dest]
                      if dest_i == rob_head.i:
-                         self.regs.stat[rob_head.dest] = None
+                         self.regs.unrename(rob_head.dest)
+
+            self.committed += 1
+            self.last_progress = self.clock
 
             # Gestion des branchs lors du sanctionnement
             if rob_head.instr.funit_type == 'Branch':
                 self.stall = False
+                if self.fingerprints is not None and rob_head.value:
+                    target = int(rob_head.instr.operands[-1][1:])
+                    if target <= rob_head.instr.addr:
+                        self.check_loop(target)
                 if (rob_head.prediction != rob_head.value):
                     # Mauvaise spéculation
                     #Si il y avait un blocage, il disparaît car on flush le ROB et les RS
-                    if rob_head.value:
-                        #On force la prise de ce branchement
-                        self.new_PC = int(rob_head.instr.operands[-1][1:])
-                    else:
-                        #On retourne à l'instruction suivant le branchement
-                        self.new_PC = rob_head.instr.addr + 1
+                    self.mispredict(rob_head)
 
-                    #Flush le ROB
+                    #Il ne reste dans le ROB que le branchement et les instructions sanctionnées
+                    #avant lui: on les retire aussi.
                     self.ROB.reset()
-
-                    #Remet les drapeaux d'écriture des registres à None
-                    self.regs.reset_stat()
-
-                    #Clean les stations de réservation
-                    self.reset_funits()
                     return
                 else:
                     # Spéculation réussite, aucun changement requis.
                     pass
             elif rob_head.instr.funit_type == 'Store':
                 #On écrit le résultat en mémoire.
+                if self.fingerprints is not None:
+                    self.record_store(rob_head.addr, rob_head.value)
                 self.mem[rob_head.addr] = rob_head.value
+            elif rob_head.instr.funit_type == 'Vector' and \
+              rob_head.instr.code in vector.VECTOR_STORES:
+                if self.fingerprints is not None:
+                    start, stride, elements = rob_head.value
+                    for addr, x in zip(vector.addresses(start, stride, len(elements)),
+                      elements.tolist()):
+                        self.record_store(addr, x)
+                vector.store(self.mem, rob_head.value)
 
             # Une fois l'instruction sanctionnée, on la conserve pendant un coup d'horloge
             rob_head.state = State.COMMIT
+            i = (i + 1) % self.ROB.maxlen
+
+    def mispredict(self, rob_entry):
+        '''
+        Branchement `rob_entry` mal prédit: redirige le lancement vers la bonne instruction et
+         annule les instructions lancées après le branchement (voir `squash_after`).
+        '''
+        if rob_entry.value:
+            #On force la prise de ce branchement
+            self.new_PC = int(rob_entry.instr.operands[-1][1:])
+        else:
+            #On retourne à l'instruction suivant le branchement
+            self.new_PC = rob_entry.instr.addr + 1
+
+        self.squash_after(rob_entry)
+        #La prédiction est corrigée, le sanctionnement n'aura rien à annuler.
+        rob_entry.prediction = rob_entry.value
+
+    def squash_after(self, rob_entry):
+        '''
+        Annule les instructions plus jeunes que le branchement `rob_entry`. Seules les entrées
+         du ROB retirées et les unités fonctionnelles qu'elles occupaient sont libérées, puis le
+         renommage des registres est remis dans l'état où il était au lancement du branchement:
+         le coût est proportionnel au nombre d'instructions annulées.
+        '''
+        self.release(self.ROB.squash_after(rob_entry.i))
+
+        #Seuls les renommages par des instructions encore dans le ROB (donc plus vieilles que
+        #le branchement) et pas encore sanctionnées sont conservés.
+        age = self.ROB.age(rob_entry.i)
+        self.regs.restore_stat(dict((k, i) for k, i in rob_entry.checkpoint.items()
+            if self.ROB.age(i) < age and self.ROB[i].state != State.COMMIT))
+
+    def release(self, squashed):
+        '''
+        Libère les unités fonctionnelles des entrées du ROB annulées `squashed` (voir
+         `components.ROB.squash_after`).
+        '''
+        for i, funit_name in squashed:
+            self.waiters.pop(i, None)
+            self.third_waiters.pop(i, None)
+            funit = self.funits_by_name.get(funit_name)
+            if funit is not None and funit.busy and funit.dest == i:
+                funit.reset()
+
+    def speculate_load(self, funit, rob_e):
+        '''
+        Désambiguïsation spéculative: le Load `rob_e` peut démarrer avant que l'adresse des
+         Stores qui le précèdent soit connue, sauf pour ceux que le prédicteur de dépendances
+         (`components.StoreSetPredictor`) associe à ce Load. Si le plus jeune Store précédent
+         écrit à la même adresse, sa valeur est transmise directement au Load (dès qu'elle est
+         prête). Retourne True si le Load peut démarrer.
+        '''
+        rob_e.addr = funit.A
+        load_age = self.ROB.age(rob_e.i)
+        match = None
+        for i in self.ROB.stores:
+            if self.ROB.age(i) >= load_age:
+                break
+            e = self.ROB[i]
+            if e.addr is None:
+                #Un SV n'est jamais vérifié par `check_memory_order`.
+                if e.instr.funit_type != 'Store' or \
+                  self.store_sets.same_set(rob_e.instr.addr, e.instr.addr):
+                    return False
+            elif e.addr == funit.A:
+                match = e
+        if match is not None and not match.ready:
+            return False
+        rob_e.forward = None if match is None else match.i
+        return True
+
+    def check_memory_order(self, store_e):
+        '''
+        L'adresse du Store `store_e` vient d'être calculée. Les Loads plus jeunes lisant à
+         cette adresse et en cours d'exécution sont redémarrés; si l'un d'eux a déjà écrit une
+         valeur obtenue d'une source plus vieille que ce Store, l'ordre mémoire a été violé:
+         le Load et les instructions suivantes sont annulés puis relancés. Dans les deux cas,
+         le prédicteur de dépendances apprend à associer le Load à ce Store.
+        '''
+        store_age = self.ROB.age(store_e.i)
+        i = (store_e.i + 1) % self.ROB.maxlen
+        for _ in range(len(self.ROB) - store_age - 1):
+            e = self.ROB[i]
+            i = (i + 1) % self.ROB.maxlen
+            if e.instr.funit_type != 'Load' or e.addr != store_e.addr:
+                continue
+            #Valeur obtenue d'un Store plus jeune que celui-ci: pas de problème.
+            if e.forward is not None and self.ROB.age(e.forward) > store_age:
+                continue
+            if e.ready:
+                self.mem_stats['violations'] += 1
+                self.store_sets.violation(e.instr.addr, store_e.instr.addr)
+                self.replay_from(e)
+                return
+            funit = self.funits_by_name[e.funit]
+            if funit.busy and funit.dest == e.i and funit.time is not None:
+                self.mem_stats['restarts'] += 1
+                self.store_sets.violation(e.instr.addr, store_e.instr.addr)
+                funit.time = None
+
+    def replay_from(self, rob_entry):
+        '''
+        Annule l'instruction `rob_entry` et toutes celles qui la suivent, puis reprend le
+         lancement à partir de cette instruction. Le renommage des registres est reconstruit à
+         partir des entrées restantes du ROB.
+        '''
+        self.new_PC = rob_entry.instr.addr
+        self.release(self.ROB.squash_after((rob_entry.i - 1) % self.ROB.maxlen))
+        self.regs.reset_stat()
+        for e in self.ROB:
+            if e.dest is not None and e.state != State.COMMIT:
+                self.regs.rename(e.dest, e.i)
+
+    def memory_report(self):
+        '''Description des statistiques de la désambiguïsation spéculative.'''
+        stats = self.mem_stats
+        return ('Désambiguïsation spéculative: %i Loads servis par un Store, %i Loads '
+            'redémarrés, %i violations de l\'ordre mémoire.' % (stats['forwarded'],
+            stats['restarts'], stats['violations']))
 
     def exec_instr(self, func_unit, rob_entry):
         '''
@@ -224,7 +636,21 @@ class Simulator:
                 load_type = 'float'
             else:
                 raise Exception('Instruction Load inconnue (%s).' % (instr.code))
-            rob_entry.value = self.mem.load(func_unit.A, load_type)
+            if self.disambiguation == 'speculative':
+                #La valeur peut venir d'un Store pas encore sanctionné. Son type ne sera
+                #vérifié qu'au sanctionnement: le Load peut encore être annulé.
+                store = self.ROB[rob_entry.forward] if rob_entry.forward is not None else None
+                if store is not None and self.ROB.age(store.i) < self.ROB.age(rob_entry.i) \
+                  and store.state != State.COMMIT:
+                    self.mem_stats['forwarded'] += 1
+                    rob_entry.value = store.value
+                else:
+                    rob_entry.value = self.mem[func_unit.A]
+            else:
+                rob_entry.value = self.mem.load(func_unit.A, load_type)
+        elif instr.funit_type == 'Vector':
+            rob_entry.value = vector.execute(func_unit, self.mem, self.regs.vector_length)
+            self.vector_done[rob_entry.i] = self.clock
         else:
             result = eval('%s %s %s' % (func_unit.vj, instr.operator, func_unit.vk))
             rob_entry.value = result
@@ -242,7 +668,7 @@ class Simulator:
             value = int(operand[1:])
             rob_i = None
         #Registre
-        elif operand[0] in ['R', 'F']:
+        elif operand[0] in ['R', 'F', 'V']:
             #On vérifie si le registre attend après une autre instruction (on évite les WAR)
             rob_i = self.regs.stat[operand]
             value = self.regs[operand]
@@ -280,6 +706,8 @@ class Simulator:
         '''
         #Variable temporaire pour savoir si nous avons mis à jour une UF.
         updated = [[False] * len(funit) for _, funit in self.RS.items()]
+        #Unités ayant terminé leur exécution et attendant un bus commun.
+        results = []
 
         #Première passe, les instructions devant fournir des opérandes doivent le faire
         #avant de tenter d'exécuter quoi que ce soit.
@@ -296,17 +724,12 @@ class Simulator:
                         #Si on passe de 0 à -1, l'unité redevient disponible et le résultat est
                         # écrit (Write de Tomasulo)
                         if funit.time < 1:
-                            #Calcule le résultat
-                            exec_rob_entry = self.ROB[funit.dest]
-                            self.exec_instr(funit, exec_rob_entry)
-
-                            # Writeback Tomasulo, écriture de l'instruction sur le CDB et mise à
-                            # jour des stations de réservation
-                            success = self.writeback_tomasulo(funit, funit.dest, exec_rob_entry.value)
-                            if success:
-                                funit.reset()
-                            #Le writeback peut échouer dans le cas d'un Store... on va réessayer au
-                            #prochain coup d'horloge.
+                            #Avec un nombre limité de bus communs, les résultats sont écrits
+                            #après arbitrage. Le Store n'utilise pas le CDB.
+                            if self.cdb_buses > 0 and unit_type != 'Store':
+                                results.append(funit)
+                            else:
+                                self.complete(funit)
 
                         # Sinon, simplement la décrémenter de 1
                         else:
@@ -314,6 +737,9 @@ class Simulator:
                             #L'unité est en train de s'exécuter, donc on l'indique.
                             self.ROB[funit.dest].state = State.EXECUTE
 
+        if len(results) > 0:
+            self.arbitrate(results)
+
         #Seconde passe, tenter de démarrer l'exécution des unités fonctionnelles en attente d'opérandes.
         for i, (unit_type, units) in enumerate(self.RS.items()):
             for j, funit in enumerate(units):
@@ -343,6 +769,7 @@ class Simulator:
 
             #Occuper une place dans le ROB
             cur_rob_i, cur_rob_entry = self.ROB.get_free_entry()
+            self.last_progress = self.clock
             cur_rob_entry.instr = cur_instruction
             cur_rob_entry.state = State.ISSUE
             cur_rob_entry.ready = False
@@ -354,6 +781,8 @@ class Simulator:
             # Vérifier les paramètres des opérations voir s'ils vont dans le vj/vk ou qj/qk
             if cur_instruction.funit_type == 'Store':
                 to_check = [0, 1]
+            elif cur_instruction.funit_type == 'Vector':
+                to_check = interp.VECTOR_SOURCES.get(cur_instruction.code, [1, 2])
             elif cur_instruction.funit_type == 'Branch':
                 if cur_instruction.code in ['BEQZ', 'BNEZ']:
                     to_check = [0]
@@ -364,8 +793,9 @@ class Simulator:
             else:
                 to_check = [1, 2]
 
-            # Trouver Vj/Vk ou Qj/Qk
-            first_operand = True
+            # Trouver Vj/Vk ou Qj/Qk (Vs/Qs pour le troisième opérande d'une instruction
+            # vectorielle)
+            slot = 0
             for i in to_check:
                 if len(cur_instruction.operands) < i + 1:
                     continue
@@ -398,21 +828,33 @@ class Simulator:
                 else:
                     value_ready = True
 
-                if first_operand:
+                if slot == 0:
                     if value_ready:
                         cur_funit.vj = value
                     else:
                         #Utiliser la valeur de format '#ROB' plutôt
                         #que le numéro de registre directement
                         cur_funit.qj = value
-                else:
+                elif slot == 1:
                     if value_ready:
                         cur_funit.vk = value
                     else:
                         #Utiliser la valeur de format '#ROB' plutôt
                         #que le numéro de registre directement
                         cur_funit.qk = value
-                first_operand = False
+                else:
+                    if value_ready:
+                        cur_funit.vs = value
+                    else:
+                        cur_funit.qs = value
+                        self.third_waiters.setdefault(value, []).append(cur_funit)
+                if not value_ready:
+                    if slot < 2:
+                        self.waiters.setdefault(value, []).append(cur_funit)
+                    if raw_operand[0] == 'V' and raw_operand != 'VL':
+                        #Vecteur attendu, voir `vector_latency`.
+                        cur_funit.sources.append(value)
+                slot += 1
 
             #Tente de démarrer l'exécution (elle ne débutera réellement qu'au prochain appel
             # à decrement_time)
@@ -431,7 +873,9 @@ class Simulator:
             if destination is not None:
                 cur_rob_entry.dest = self.instructions[self.PC].operands[destination]
                 #Indiquer que le registre attend une valeur de `cur_rob_i`
-                self.regs.stat[self.instructions[self.PC].operands[destination]] = cur_rob_i
+                self.regs.rename(self.instructions[self.PC].operands[destination], cur_rob_i)
+            elif cur_instruction.funit_type == 'Store' or cur_instruction.code in ('SV', 'SVWS'):
+                self.ROB.add_store(cur_rob_i)
 
             #La destination pour l'UF est toujours l'entrée ROB correspondante.
             cur_funit.dest = cur_rob_i
@@ -445,6 +889,9 @@ class Simulator:
                 # adresse du branchement
                 cur_funit.A = int(self.instructions[self.PC].operands[-1][1:])
 
+                #Renommage au lancement, restauré si le branchement est mal prédit.
+                cur_rob_entry.checkpoint = self.regs.checkpoint()
+
                 # Demande la prédiction à notre unité de branchement (celle-ci doit définir
                 # la fonction get_prediction(pc, dest)
                 #Hennessy ne spécifie pas où placer la prédiction
@@ -477,6 +924,8 @@ class Simulator:
                     funit.A = funit.vk + funit.A
                     rob_e.addr = funit.A
                     funit.vk = None
+                    if self.disambiguation == 'speculative':
+                        self.check_memory_order(rob_e)
         elif instr.funit_type == 'Load':
             #On calcule la première étape du Load immédiatement
             if funit.qj == None:
@@ -488,37 +937,148 @@ class Simulator:
                 #Pas prêt pour l'exécution
                 return False
 
-            wait_for_store = False
-            for e in self.ROB:
-                #Arrivé à l'instruction courante, cesse de parcourir le ROB
-                if e.i == funit.dest:
-                    break
-                if e.instr.funit_type == 'Store':
+            if self.disambiguation == 'speculative':
+                ready = self.speculate_load(funit, rob_e)
+            else:
+                wait_for_store = False
+                #Seuls les Stores précédant le Load dans le ROB sont examinés.
+                load_age = self.ROB.age(rob_e.i)
+                for i in self.ROB.stores:
+                    #Arrivé à l'instruction courante, cesse de parcourir le ROB
+                    if self.ROB.age(i) >= load_age:
+                        break
+                    e = self.ROB[i]
                     #Convention différente pour stocker l'addresse de destination, car le Store
                     #lit l'addresse mémoire après que l'unité fonctionnelle ait été relâchée.
                     #Si on ne sait pas où va écrire le Store ou s'il va écrire à la même adr
                     if e.addr == None or e.addr == funit.A:
                         wait_for_store = True
                         break
-            if not wait_for_store:
-                ready = True
+                if not wait_for_store:
+                    ready = True
+        elif instr.funit_type == 'Vector':
+            if funit.qj == None and funit.qk == None and funit.qs == None:
+                ready = instr.code not in vector.VECTOR_LOADS or \
+                    not vector.load_conflicts(funit, self.ROB, rob_e)
+                funit.elements = vector.element_count(funit)
         else:
             if funit.qj == None and funit.qk == None:
                 ready = True
 
+        #Une unité pipelinée n'accepte une nouvelle opération que lorsqu'un de ses pipelines
+        #est libre. Les voies d'une unité vectorielle sont occupées le temps de traiter tous
+        #les éléments.
+        if ready and instr.funit_type in self.pipelines:
+            ready = self.enter_pipeline(instr.funit_type,
+                funit.chimes() if instr.funit_type == 'Vector' else None)
+
         #Démarre l'exécution si les conditions sont rencontrées.
         if ready:
-            if instr.funit_type == 'Mult':
-                #Temps d'exécution différents pour multiplication et division
-                if instr.action.find('*') > -1:
-                    funit.time = funit.latency
-                else:
-                    funit.time = funit.div_latency
+            if self.cache is not None and instr.funit_type in ('Load', 'Store'):
+                #La latence dépend de l'accès au cache.
+                funit.time = self.cache.access(funit.A)
+            elif instr.funit_type == 'Vector':
+                funit.time = self.vector_latency(funit)
             else:
-                funit.time = funit.latency
+                funit.time = funit.get_latency(instr)
             return True
         return False
 
+    def complete(self, funit):
+        '''
+        Termine l'exécution de l'instruction de `funit` et écrit son résultat. Retourne False si
+         l'écriture a échoué (Store dont la valeur n'est pas prête), l'unité réessaiera alors au
+         prochain coup d'horloge.
+        '''
+        #Calcule le résultat
+        exec_rob_entry = self.ROB[funit.dest]
+        self.exec_instr(funit, exec_rob_entry)
+
+        # Writeback Tomasulo, écriture de l'instruction sur le CDB et mise à
+        # jour des stations de réservation
+        success = self.writeback_tomasulo(funit, funit.dest, exec_rob_entry.value)
+        if success:
+            funit.reset()
+            #Récupération dès la résolution d'un branchement mal prédit.
+            if self.recovery == 'resolve' and exec_rob_entry.instr.funit_type == 'Branch' and \
+              exec_rob_entry.prediction != exec_rob_entry.value:
+                self.mispredict(exec_rob_entry)
+        return success
+
+    def arbitrate(self, results):
+        '''
+        Attribue les `cdb_buses` bus communs aux unités `results` ayant terminé leur exécution,
+         dans l'ordre du programme ('oldest') ou selon l'ordre des types d'unités de la
+         configuration ('type'). Les autres réessaieront au prochain coup d'horloge.
+        '''
+        if self.cdb_arbitration == 'oldest':
+            results.sort(key=lambda funit: self.ROB.age(funit.dest))
+        granted = results[:self.cdb_buses]
+        if len(results) > self.cdb_buses:
+            self.cdb_stats['contended_cycles'] += 1
+            self.cdb_stats['delayed'] += len(results) - self.cdb_buses
+
+        #Une récupération peut annuler les unités suivantes.
+        dests = [funit.dest for funit in granted]
+        for funit, dest in zip(granted, dests):
+            if funit.busy and funit.dest == dest:
+                self.complete(funit)
+                self.cdb_stats['broadcasts'] += 1
+
+    def cdb_report(self):
+        '''Description des statistiques d'utilisation des bus communs.'''
+        stats = self.cdb_stats
+        return ('Bus communs (%i): %i résultats écrits, %i coups d\'horloge avec contention, '
+            '%i résultats retardés d\'un coup d\'horloge.' % (self.cdb_buses,
+            stats['broadcasts'], stats['contended_cycles'], stats['delayed']))
+
+    def enter_pipeline(self, unit_type, occupancy=None):
+        '''
+        Tente de faire entrer une opération dans un des pipelines des unités `unit_type`. Un
+         pipeline accepte une nouvelle opération tous les `initiation_interval` coups d'horloge,
+         ou après `occupancy` coups d'horloge si donné.
+        '''
+        interval, next_free = self.pipelines[unit_type]
+        if occupancy is not None:
+            interval = occupancy
+        for k, clock in enumerate(next_free):
+            if clock <= self.clock:
+                next_free[k] = self.clock + interval
+                return True
+        return False
+
+    def vector_latency(self, funit):
+        '''
+        Latence de l'instruction vectorielle de `funit`, qui démarre. Elle est chaînée (voir
+         `components.VectorUnit`) si l'un des vecteurs qu'elle attendait vient d'être écrit.
+         Avec une hiérarchie de caches, chaque élément d'un accès mémoire passe par le cache et
+         le démarrage est l'accès le plus lent, comme la latence d'un Load ou d'un Store.
+        '''
+        chained = funit.chaining and any(self.vector_done.get(i) == self.clock for i in
+            funit.sources)
+        startup = None
+        code = funit.instr.code
+        if self.cache is not None and funit.elements > 0 and (code in vector.VECTOR_LOADS or
+          code in vector.VECTOR_STORES):
+            start, stride, n = vector.operands(funit)
+            startup = max([self.cache.access(a) for a in vector.addresses(start, stride, n)])
+        return funit.get_latency(funit.instr, chained, startup)
+
+    def reset_pipelines(self):
+        '''
+        Prépare les pipelines des types d'unités ayant un paramètre `initiation_interval`:
+         {type: (intervalle, [coup d'horloge où chaque pipeline sera libre])}.
+        '''
+        self.pipelines = {}
+        for name, params in self.config.funits.items():
+            if 'initiation_interval' in params:
+                self.pipelines[name] = (int(params['initiation_interval']),
+                    [0] * int(params.get('pipelines', 1)))
+            elif name == 'Vector':
+                #Par défaut, chaque unité vectorielle a ses propres voies.
+                self.pipelines[name] = (1, [0] * int(params.get('pipelines',
+                    params['number'])))
+
     def writeback_tomasulo(self, wb_funit, wb_rob_entry_idx, value=None):
         '''
         Une fois l'exécution d'une instruction terminée, il est possible de placer sa valeur
@@ -533,18 +1093,23 @@ class Simulator:
                 #Store pas prêt pour Writeback.
                 return False
         else:
-            for _, funit_type in self.RS.items():
-                for funit in funit_type:
-                    #Mise à jour requise uniquement lorsque l'unité attend ses paramètres.
-                    if funit.qj == wb_rob_entry_idx:
-                        funit.vj = value
-                        funit.qj = None
-                    if funit.qk == wb_rob_entry_idx:
-                        funit.vk = value
-                        funit.qk = None
+            #Seules les unités attendant ce résultat sont mises à jour.
+            for funit in self.waiters.pop(wb_rob_entry_idx, ()):
+                if funit.qj == wb_rob_entry_idx:
+                    funit.vj = value
+                    funit.qj = None
+                if funit.qk == wb_rob_entry_idx:
+                    funit.vk = value
+                    funit.qk = None
+            if self.third_waiters:
+                for funit in self.third_waiters.pop(wb_rob_entry_idx, ()):
+                    if funit.qs == wb_rob_entry_idx:
+                        funit.vs = value
+                        funit.qs = None
             rob_entry.value = value
 
         #Writeback complété
+        self.last_progress = self.clock
         rob_entry.ready = True
         rob_entry.state = State.WRITE
         #Libère l'unité fonctionnelle
@@ -563,44 +1128,289 @@ class Simulator:
             return i
         return -1
 
-    def load_config(self, config_file):
+    def load_config(self, config, memory=None):
         '''
         Initialise le simulateur en fonction de ce qui est défini dans le fichier XML
-         de configuration.
+         de configuration. `config` peut être un nom de fichier ou un objet `Configuration`
+         déjà lu. Si `memory` est donnée (e.g. une `components.OverlayMemory` sur une image
+         partagée), elle remplace la mémoire décrite par la configuration.
         '''
-
-        # Ouvrir le fichier XML
-        try:
-            print('Lecture du fichier de configuration %s en cours...' % config_file)
-            xml_data = parse(config_file)
-            print('Fichier de configuration lu avec succès.')
-        except:
-            raise Exception('Impossible d\'utiliser le fichier de configuration '
-                'XML.')
-
-        self.RS['Load'] = create_functional_units(xml_data, 'Load', 1, 1)
-        self.RS['Store'] = create_functional_units(xml_data, 'Store', 1, 1)
-        self.RS['Add'] = create_functional_units(xml_data, 'Add', 1, 1)
-        self.RS['Mult'] = create_functional_units(xml_data, 'Mult', 1, 1,
-         additional_defaults={'div_latency': 1})
-        self.RS['ALU'] = create_functional_units(xml_data, 'ALU', 1, 1)
-        self.RS['Branch'] = create_functional_units(xml_data, 'Branch', 1, 1)
+        if not isinstance(config, Configuration):
+            config = read_config(config)
+
+        self.ROB = components.ROB(config.rob_size)
+        #Extension vectorielle, seulement si des unités vectorielles sont configurées: NumPy
+        #n'est requis que dans ce cas.
+        self.vectors = 'Vector' in config.funits
+        if self.vectors:
+            self.regs = vector.VectorRegisters(config.num_registers, config.vector_registers,
+                config.vector_length)
+        else:
+            self.regs = components.Registers(config.num_registers)
+        #Coup d'horloge de l'écriture du résultat de chaque instruction vectorielle, par entrée
+        #du ROB (voir `vector_latency`), et unités attendant un troisième opérande.
+        self.vector_done = {}
+        self.third_waiters = {}
+
+        for name, params in config.funits.items():
+            self.RS[name] = build_functional_units(name, params)
+        self.funits_by_name = dict((f.name, f) for units in self.RS.values() for f in units)
+        self.config = config
+        self.reset_pipelines()
+        self.cdb_buses = config.cdb_buses
+        self.cdb_arbitration = config.cdb_arbitration
+        self.cdb_stats = dict.fromkeys(['broadcasts', 'contended_cycles', 'delayed'], 0)
+        self.disambiguation = config.disambiguation
+        self.store_sets = components.StoreSetPredictor(config.store_set_bits)
+        self.mem_stats = dict.fromkeys(['forwarded', 'restarts', 'violations'], 0)
+        self.recovery = config.recovery
+        self.issue_width = config.issue_width
+        self.commit_width = config.commit_width
+        self.cache = config.create_cache()
 
         # Attribution des registres
-        register_nodes = xml_data.getElementsByTagName('Registers')[0].childNodes
-        register_nodes = zip(register_nodes[::2], register_nodes[1::2])
-        for a in register_nodes:
-            name = a[1].tagName
-            value = a[1]._attrs['value'].value
+        for name, value in config.registers:
             self.regs[name] = value
 
         # Attribution de la mémoire
+        if memory is not None:
+            self.mem = memory
+        else:
+            self.mem = config.create_memory()
+
+
+class Configuration(object):
+    '''
+    Contenu d'un fichier XML de configuration. Les paramètres des unités fonctionnelles sont
+     conservés tels quels (chaînes de caractères) et ne sont convertis qu'à la construction
+     des unités, ce qui permet de partager une même configuration entre plusieurs simulateurs.
+
+    Paramètres:
+    -----------
+    funits: OrderedDict associant chaque type d'unité fonctionnelle à ses paramètres (incluant
+     'number' et possiblement 'class').
+    registers: liste de tuples (nom du registre, valeur initiale).
+    mem_size: nombre de mots de la mémoire.
+    mem_init_values: valeurs initiales des premiers mots de la mémoire.
+    mem_backend: représentation de la mémoire, voir `components.memory_backends` ('flat',
+     'paged' ou 'sparse').
+    rob_size: nombre d'entrées du ROB.
+    num_registers: nombre de registres entiers (et de registres flottants).
+    cdb_buses: nombre de bus communs (CDB), 0 pour un nombre illimité.
+    cdb_arbitration: attribution des bus communs, aux instructions les plus vieilles
+     ('oldest') ou selon l'ordre des types d'unités ('type').
+    disambiguation: démarrage des Loads, après que l'adresse de tous les Stores précédents
+     soit connue ('conservative') ou de façon spéculative ('speculative', voir
+     `Simulator.speculate_load`).
+    store_set_bits: taille (log2) de la table du prédicteur de dépendances mémoire.
+    vector_registers: nombre de registres vectoriels (s'il y a des unités vectorielles).
+    vector_length: nombre maximal d'éléments d'un registre vectoriel.
+    issue_width: nombre maximal d'instructions lancées par coup d'horloge.
+    commit_width: nombre maximal d'instructions sanctionnées par coup d'horloge.
+    recovery: moment de la récupération après un branchement mal prédit, au sanctionnement
+     ('commit') ou dès la résolution du branchement ('resolve').
+    cache_levels: OrderedDict associant chaque niveau de cache (e.g. 'L1') à ses paramètres,
+     vide s'il n'y a pas de cache (voir `cache.py`).
+    memory_latency: latence d'un accès manquant tous les niveaux de cache.
+    '''
+    def __init__(self, funits, registers, mem_size, mem_init_values, mem_backend='flat',
+      rob_size=components.ROB_SIZE, num_registers=components.NUM_REGISTERS,
+      recovery='commit', cache_levels=None, memory_latency=cache.MEMORY_LATENCY,
+      issue_width=1, commit_width=1, cdb_buses=0, cdb_arbitration='oldest',
+      disambiguation='conservative', store_set_bits=10, vector_registers=8, vector_length=64):
+        self.funits = funits
+        self.vector_registers = int(vector_registers)
+        self.vector_length = int(vector_length)
+        check_core_choice('disambiguation', disambiguation)
+        self.disambiguation = disambiguation
+        self.store_set_bits = int(store_set_bits)
+        self.cdb_buses = int(cdb_buses)
+        check_core_choice('cdb_arbitration', cdb_arbitration)
+        self.cdb_arbitration = cdb_arbitration
+        self.issue_width = int(issue_width)
+        self.commit_width = int(commit_width)
+        if self.issue_width < 1 or self.commit_width < 1:
+            raise Exception('Les largeurs de lancement et de sanctionnement doivent être d\'au '
+                'moins 1.')
+        self.cache_levels = cache_levels if cache_levels is not None else OrderedDict()
+        self.memory_latency = int(memory_latency)
+        self.rob_size = int(rob_size)
+        self.num_registers = int(num_registers)
+        check_core_choice('recovery', recovery)
+        self.recovery = recovery
+        self.registers = registers
+        self.mem_size = mem_size
+        self.mem_init_values = mem_init_values
+        if mem_backend not in components.memory_backends:
+            raise Exception('Représentation de la mémoire inconnue: %s (choix: %s).' %
+                (mem_backend, ', '.join(sorted(components.memory_backends))))
+        self.mem_backend = mem_backend
+
+    def copy(self):
+        '''Retourne une copie pouvant être modifiée sans affecter l'originale.'''
+        funits = OrderedDict((k, dict(v)) for k, v in self.funits.items())
+        cache_levels = OrderedDict((k, dict(v)) for k, v in self.cache_levels.items())
+        return Configuration(funits, list(self.registers), self.mem_size, self.mem_init_values,
+            self.mem_backend, self.rob_size, self.num_registers, self.recovery, cache_levels,
+            self.memory_latency, self.issue_width, self.commit_width, self.cdb_buses,
+            self.cdb_arbitration, self.disambiguation, self.store_set_bits,
+            self.vector_registers, self.vector_length)
+
+    def create_memory(self):
+        '''Construit la mémoire initiale décrite par la configuration.'''
+        return components.memory_backends[self.mem_backend](self.mem_size,
+            self.mem_init_values)
+
+    def create_cache(self):
+        '''Construit la hiérarchie de caches (`cache.CacheHierarchy`), ou None sans cache.'''
+        if len(self.cache_levels) == 0:
+            return None
+        return cache.create_hierarchy(self.cache_levels, self.memory_latency)
+
+    def set(self, key, value):
+        '''
+        Remplace un paramètre d'unité fonctionnelle. `key` est de la forme 'Type.paramètre',
+         par exemple 'Mult.latency' ou 'ALU.number'. Les paramètres du processeur sont
+         ceux de `core_params`, e.g. 'Core.rob_size'. Ceux des caches sont de la forme
+         'Cache.L1.size' ou 'Cache.memory_latency'.
+        '''
+        funit_type, param = self.split_key(key)
+        if funit_type == 'Cache':
+            if param == 'memory_latency':
+                self.memory_latency = int(value)
+            else:
+                level, level_param = param.split('.', 1)
+                self.cache_levels[level][level_param] = str(value)
+        elif funit_type == 'Core':
+            field, convert = core_params[param]
+            check_core_choice(param, value)
+            self.__setattr__(field, convert(value))
+        else:
+            self.funits[funit_type][param] = str(value)
+
+    def get(self, key):
+        '''Retourne la valeur d'un paramètre (voir `set`), ou None s'il n'est pas défini.'''
+        funit_type, param = self.split_key(key)
+        if funit_type == 'Cache':
+            if param == 'memory_latency':
+                return str(self.memory_latency)
+            level, level_param = param.split('.', 1)
+            return self.cache_levels[level].get(level_param)
+        if funit_type == 'Core':
+            return str(self.__getattribute__(core_params[param][0]))
+        return self.funits[funit_type].get(param)
+
+    def split_key(self, key):
         try:
-            mem_init_values = xml_data.getElementsByTagName('Memory')[0].childNodes[0].data.strip().split()
-        except:
-            mem_init_values = []
-        mem_size = int(xml_data.getElementsByTagName('Memory')[0]._attrs['size'].value)
-        self.mem = components.Memory(mem_size, mem_init_values)
+            funit_type, param = key.split('.', 1)
+        except ValueError:
+            raise Exception('Paramètre invalide: %s (format attendu: Type.paramètre).' % key)
+        if funit_type == 'Core':
+            if param not in core_params:
+                raise Exception('Paramètre du processeur inconnu: %s (choix: %s).' % (param,
+                    ', '.join(sorted(core_params))))
+        elif funit_type == 'Cache':
+            if param != 'memory_latency' and (param.split('.')[0] not in self.cache_levels
+              or param.count('.') != 1):
+                raise Exception('Paramètre de cache inconnu: %s (format attendu: '
+                    'Cache.niveau.paramètre ou Cache.memory_latency).' % param)
+        elif funit_type not in self.funits:
+            raise Exception('Type d\'unité fonctionnelle inconnu: %s.' % funit_type)
+        return funit_type, param
+
+
+#Attributs de la balise <Core>: champs correspondants de `Configuration` et conversion.
+core_params = {'rob_size': ('rob_size', int), 'registers': ('num_registers', int),
+    'recovery': ('recovery', str), 'issue_width': ('issue_width', int),
+    'commit_width': ('commit_width', int), 'cdb_buses': ('cdb_buses', int),
+    'cdb_arbitration': ('cdb_arbitration', str), 'disambiguation': ('disambiguation', str),
+    'store_set_bits': ('store_set_bits', int), 'vector_registers': ('vector_registers', int),
+    'vector_length': ('vector_length', int)}
+
+#Valeurs possibles des paramètres du processeur qui ne sont pas des nombres: moment de la
+#récupération après un branchement mal prédit, attribution des bus communs et démarrage des
+#Loads.
+core_choices = {'recovery': ['commit', 'resolve'], 'cdb_arbitration': ['oldest', 'type'],
+    'disambiguation': ['conservative', 'speculative']}
+
+
+def check_core_choice(param, value):
+    '''Vérifie que `value` est une valeur permise du paramètre du processeur `param`.'''
+    if param in core_choices and value not in core_choices[param]:
+        raise Exception('Valeur inconnue pour %s: %s (choix: %s).' % (param, value,
+            ', '.join(core_choices[param])))
+
+
+def read_config(config_file):
+    '''
+    Lit le fichier XML de configuration `config_file` et retourne un objet `Configuration`.
+    '''
+    # Ouvrir le fichier XML
+    try:
+        print('Lecture du fichier de configuration %s en cours...' % config_file)
+        xml_data = parse(config_file)
+        print('Fichier de configuration lu avec succès.')
+    except:
+        raise Exception('Impossible d\'utiliser le fichier de configuration '
+            'XML.')
+
+    funits = OrderedDict()
+    funits['Load'] = read_functional_units_params(xml_data, 'Load', 1, 1)
+    funits['Store'] = read_functional_units_params(xml_data, 'Store', 1, 1)
+    funits['Add'] = read_functional_units_params(xml_data, 'Add', 1, 1)
+    funits['Mult'] = read_functional_units_params(xml_data, 'Mult', 1, 1,
+     additional_defaults={'div_latency': 1})
+    funits['ALU'] = read_functional_units_params(xml_data, 'ALU', 1, 1)
+    funits['Branch'] = read_functional_units_params(xml_data, 'Branch', 1, 1)
+    #Unités vectorielles (optionnelles), voir `vector.py`.
+    if len(xml_data.getElementsByTagName('Vector')) > 0:
+        funits['Vector'] = read_functional_units_params(xml_data, 'Vector', 1, 1)
+
+    # Valeurs initiales des registres
+    registers = []
+    register_nodes = xml_data.getElementsByTagName('Registers')[0].childNodes
+    register_nodes = zip(register_nodes[::2], register_nodes[1::2])
+    for a in register_nodes:
+        name = a[1].tagName
+        value = a[1]._attrs['value'].value
+        registers.append((name, value))
+
+    # Valeurs initiales de la mémoire
+    try:
+        mem_init_values = xml_data.getElementsByTagName('Memory')[0].childNodes[0].data.strip().split()
+    except:
+        mem_init_values = []
+    mem_attrs = xml_data.getElementsByTagName('Memory')[0]._attrs
+    mem_size = int(mem_attrs['size'].value)
+    mem_backend = mem_attrs['backend'].value if 'backend' in mem_attrs else 'flat'
+
+    # Paramètres du processeur (optionnels), e.g.
+    # <Core rob_size="256" registers="32" issue_width="4" commit_width="4"/>
+    core = {}
+    core_nodes = xml_data.getElementsByTagName('Core')
+    if len(core_nodes) > 0:
+        for k, v in core_nodes[0]._attrs.items():
+            if k not in core_params:
+                raise Exception('Paramètre du processeur inconnu: %s (choix: %s).' % (k,
+                    ', '.join(sorted(core_params))))
+            field, convert = core_params[k]
+            core[field] = convert(v.value)
+
+    # Hiérarchie de caches (optionnelle), voir `cache.py`
+    cache_levels = OrderedDict()
+    memory_latency = cache.MEMORY_LATENCY
+    cache_nodes = xml_data.getElementsByTagName('Cache')
+    if len(cache_nodes) > 0:
+        if 'memory_latency' in cache_nodes[0]._attrs:
+            memory_latency = int(cache_nodes[0]._attrs['memory_latency'].value)
+        for node in cache_nodes[0].childNodes:
+            if node.nodeType == node.ELEMENT_NODE:
+                cache_levels[node.tagName] = dict((k, v.value) for k, v in
+                    node._attrs.items())
+
+    return Configuration(funits, registers, mem_size, mem_init_values, mem_backend,
+        cache_levels=cache_levels, memory_latency=memory_latency, **core)
+
 
 def update_operands(funit, rob_entry):
     '''
@@ -619,7 +1429,17 @@ def create_functional_units(xml_data, name, default_n, default_latency, addition
     Créé une liste d'unités fonctionnelles de type `name` et tente de charger une configuration
     pour ce type dans `xml_data`.
     '''
+    fu_params = read_functional_units_params(xml_data, name, default_n, default_latency,
+        additional_defaults)
+    return build_functional_units(name, fu_params)
 
+
+def read_functional_units_params(xml_data, name, default_n, default_latency,
+  additional_defaults={}):
+    '''
+    Retourne le dictionnaire de paramètres des unités fonctionnelles de type `name` tel que défini
+    dans `xml_data`, complété par les valeurs par défaut.
+    '''
     fu_params = {}
     fu_params.update(additional_defaults)
     #Les paramètres par défaut vont être écrasés.
@@ -634,12 +1454,25 @@ def create_functional_units(xml_data, name, default_n, default_latency, addition
         print('Aucune configuration trouvée pour les unités fonctionnelles de type %s.'
             % name)
 
+    return fu_params
+
+
+def build_functional_units(name, fu_params):
+    '''
+    Génère la liste d'unités fonctionnelles de type `name` décrite par `fu_params`.
+    '''
+    fu_params = dict(fu_params)
+
     #Possibilité de mettre un champ 'class' dans le fichier de configuration XML
     #On tentera alors d'aller chercher une classe avec ce nom dans le fichier components.py
     if 'class' in fu_params:
         cl = fu_params.pop('class')
     elif name == 'Branch':
         cl = 'BranchUnit'
+    elif name == 'Mult':
+        cl = 'MultUnit'
+    elif name == 'Vector':
+        cl = 'VectorUnit'
     else:
         cl = 'FuncUnit'
 
@@ -648,6 +1481,11 @@ def create_functional_units(xml_data, name, default_n, default_latency, addition
     funit_cl = components.__getattribute__(cl)
     funits = [funit_cl(name='%s%i'%(name, i+1), **fu_params) for i in range(n)]
 
+    #Les unités de branchement à prédiction dynamique partagent un même prédicteur.
+    for funit in funits[1:]:
+        if hasattr(funit, 'share_model'):
+            funit.share_model(funits[0])
+
     return funits
 
 
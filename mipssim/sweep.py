@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Balayage de paramètres: simule toutes les combinaisons (configuration, programme, paramètres)
+ dans un bassin de processus et écrit les résultats dans un fichier CSV.
+
+Le fichier de résultats est complété au fur et à mesure; relancer la même commande après une
+ interruption ne simule que les combinaisons manquantes.
+'''
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+#local imports
+import components
+import interpreter as interp
+import result_cache
+import shared
+import simulator as sim
+
+result_fields = ['config', 'source', 'overrides', 'cycles', 'exit_code', 'state_hash',
+    'host_time']
+
+#Programmes et configurations déjà lus par le processus courant.
+_programs = {}
+_configs = {}
+#Descripteurs des programmes et des images mémoire publiés en mémoire partagée par le
+#processus parent, par nom de fichier (voir `shared.py`).
+_shared = {'programs': {}, 'memories': {}}
+
+
+def parse_override(text):
+    '''
+    Décode un paramètre de la forme 'Type.paramètre=v1,v2,...' en un tuple
+     ('Type.paramètre', [v1, v2, ...]).
+    '''
+    try:
+        key, values = text.split('=', 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError('Paramètre invalide: %s (format attendu: '
+            'Type.paramètre=v1,v2,...).' % text)
+    return key.strip(), [v.strip() for v in values.split(',')]
+
+
+def format_overrides(overrides):
+    '''Représentation textuelle d'une liste de tuples (clé, valeur).'''
+    return ';'.join('%s=%s' % kv for kv in overrides)
+
+
+def make_jobs(config_files, source_files, grid):
+    '''
+    Génère toutes les combinaisons de configurations, de programmes et de valeurs des
+     paramètres de `grid` (liste de tuples (clé, [valeurs])).
+    '''
+    keys = [k for k, _ in grid]
+    combos = list(itertools.product(*[values for _, values in grid]))
+    jobs = []
+    for config_file in config_files:
+        for source_file in source_files:
+            for combo in combos:
+                jobs.append((config_file, source_file, list(zip(keys, combo))))
+    return jobs
+
+
+def load_program(source_file):
+    '''Retourne le programme décodé `source_file`, lu une seule fois par processus.'''
+    if source_file not in _programs:
+        if source_file in _shared['programs']:
+            _programs[source_file] = shared.attach_program(_shared['programs'][source_file])
+        else:
+            _programs[source_file] = interp.interpret_asm(source_file)
+    return _programs[source_file]
+
+
+def load_config(config_file):
+    '''Retourne la configuration `config_file`, lue une seule fois par processus.'''
+    if config_file not in _configs:
+        _configs[config_file] = sim.read_config(config_file)
+    return _configs[config_file]
+
+
+def init_worker(shared_images=None):
+    '''Les simulateurs sont bavards: on fait taire les processus du bassin.'''
+    sys.stdout = open(os.devnull, 'w')
+    if shared_images is not None:
+        _shared.update(shared_images)
+
+
+def publish(images, config_files, source_files):
+    '''
+    Publie les programmes et les mémoires initiales dans `images` (`shared.SharedImages`) et
+     retourne leurs descripteurs, à passer à `init_worker`.
+    '''
+    programs = dict((f, images.publish_program(load_program(f))) for f in source_files)
+    memories = {}
+    for f in config_files:
+        config = load_config(f)
+        memories[f] = images.publish_memory(components.Memory(config.mem_size,
+            config.mem_init_values))
+    return {'programs': programs, 'memories': memories}
+
+
+def run_job(job):
+    '''
+    Simule une combinaison (configuration, programme, paramètres) et retourne une ligne de
+     résultats.
+    '''
+    config_file, source_file, overrides, options = job
+    config = load_config(config_file).copy()
+    for key, value in overrides:
+        config.set(key, value)
+    instructions = load_program(source_file)
+
+    start = time.time()
+    cache = None
+    if options.get('cache_dir'):
+        cache = result_cache.ResultCache(options['cache_dir'], options['cache_size'])
+    memory = None
+    if config_file in _shared['memories']:
+        memory = shared.attach_memory(_shared['memories'][config_file])
+    result = result_cache.cached_go(config, instructions, cache, options['go'],
+        options.get('refresh_cache', False), memory)
+    if result['exit_code'] in (sim.ExitCode.PROGRAM_ERROR, sim.ExitCode.UNEXPECTED_ERROR):
+        sys.stderr.write('%s %s %s: %s\n' % (config_file, source_file,
+            format_overrides(overrides), result['abort_reason']))
+
+    return {'config': config_file, 'source': source_file,
+        'overrides': format_overrides(overrides), 'cycles': result['cycles'],
+        'exit_code': result['exit_code'], 'state_hash': result['state_hash'],
+        'host_time': '%.4f' % (time.time() - start)}
+
+
+def job_key(row):
+    return (row['config'], row['source'], row['overrides'])
+
+
+def read_results(output_file):
+    '''
+    Lit les résultats déjà présents dans `output_file`. Les lignes incomplètes (e.g. écriture
+     interrompue) sont ignorées.
+    '''
+    rows = []
+    if os.path.exists(output_file):
+        with open(output_file, 'r') as f:
+            lines = f.read().splitlines(True)
+        #Une dernière ligne sans fin de ligne a été interrompue en cours d'écriture.
+        if len(lines) > 0 and not lines[-1].endswith('\n'):
+            lines = lines[:-1]
+        for row in csv.DictReader(lines):
+            if None not in row and all(row[k] is not None for k in result_fields):
+                rows.append(row)
+    return rows
+
+
+def write_results(output_file, rows):
+    '''
+    Remplace le contenu de `output_file` par l'en-tête et `rows`. Le fichier est écrit à côté
+     puis renommé: une interruption pendant l'écriture ne perd pas les résultats existants.
+    '''
+    directory = os.path.dirname(os.path.abspath(output_file))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            writer = csv.DictWriter(f, result_fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_path, output_file)
+    except:
+        os.unlink(temp_path)
+        raise
+
+
+def main(config_files, source_files, grid, output_file, processes, options=None):
+    if options is None:
+        options = {'go': {}}
+    jobs = make_jobs(config_files, source_files, grid)
+
+    #Reprise: on réécrit les résultats valides puis on ne simule que ce qui manque.
+    done = read_results(output_file)
+    done_keys = set(job_key(row) for row in done)
+    todo = [j + (options,) for j in jobs if (j[0], j[1], format_overrides(j[2])) not in
+        done_keys]
+    print('%i combinaisons, %i déjà simulées, %i à simuler.' % (len(jobs), len(jobs) -
+        len(todo), len(todo)))
+
+    write_results(output_file, done)
+    with open(output_file, 'a') as f:
+        writer = csv.DictWriter(f, result_fields)
+        if len(todo) == 0:
+            return 0
+
+        images = shared.SharedImages()
+        shared_images = None
+        if options.get('shared_memory'):
+            shared_images = publish(images, config_files, source_files)
+        pool = multiprocessing.Pool(processes, initializer=init_worker,
+            initargs=(shared_images,))
+        try:
+            for i, row in enumerate(pool.imap_unordered(run_job, todo)):
+                writer.writerow(row)
+                f.flush()
+                print('[%i/%i] %s %s %s: %s cycles' % (i + 1, len(todo), row['config'],
+                    row['source'], row['overrides'], row['cycles']))
+            pool.close()
+        except KeyboardInterrupt:
+            print('Interruption, les résultats obtenus sont conservés dans %s.' % output_file)
+            pool.terminate()
+            return 1
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            images.close()
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simule toutes les combinaisons de \
+configurations, de programmes et de paramètres d\'unités fonctionnelles.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-c', dest='config_files', nargs='+', required=True,
+        help='Fichiers xml de configuration.')
+    parser.add_argument('-s', dest='source_files', nargs='+', required=True,
+        help='Fichiers de code source.')
+    parser.add_argument('-p', dest='grid', action='append', type=parse_override, default=[],
+        help='Valeurs d\'un paramètre des unités fonctionnelles, e.g. Mult.latency=4,8. Peut \
+être répété.')
+    parser.add_argument('-o', dest='output_file', default='sweep.csv',
+        help='Fichier CSV de résultats.')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+        help='Nombre de processus (par défaut, le nombre de processeurs).')
+
+    parser.add_argument('--max-cycles', type=int, default=None, help="Nombre maximal de coups \
+d'horloge par simulation.")
+    parser.add_argument('--max-instr', type=int, default=None, dest='max_instructions',
+        help="Nombre maximal d'instructions sanctionnées par simulation.")
+    parser.add_argument('--timeout', type=float, default=None, dest='max_time', help="Temps \
+d'exécution maximal par simulation, en secondes.")
+    parser.add_argument('--detect-loops', default=False, action='store_true', help="Détecte \
+les boucles infinies.")
+    parser.add_argument('--stall-limit', type=int, default=None, help="Arrête une simulation \
+si aucune instruction n'est lancée, écrite ou sanctionnée pendant ce nombre de coups \
+d'horloge.")
+
+    parser.add_argument('--shared-memory', default=False, action='store_true', help="Publie \
+les programmes et les mémoires initiales en mémoire partagée: les processus ne conservent \
+qu'une copie des mots qu'ils modifient.")
+
+    parser.add_argument('--cache', dest='cache_dir', default=None, help="Répertoire du cache \
+de résultats. Les combinaisons déjà simulées (même programme, même configuration et même \
+version du simulateur) n'y sont pas resimulées.")
+    parser.add_argument('--cache-size', type=int, default=64, help="Taille maximale du cache, \
+en Mo.")
+    parser.add_argument('--refresh-cache', default=False, action='store_true', help="Resimule \
+toutes les combinaisons et met le cache à jour.")
+
+    args = parser.parse_args()
+
+    go_options = {'max_cycles': args.max_cycles, 'max_instructions': args.max_instructions,
+        'max_time': args.max_time, 'detect_loops': args.detect_loops,
+        'stall_limit': args.stall_limit}
+    options = {'go': go_options, 'cache_dir': args.cache_dir,
+        'cache_size': args.cache_size * 1024 * 1024, 'refresh_cache': args.refresh_cache,
+        'shared_memory': args.shared_memory}
+    sys.exit(main(args.config_files, args.source_files, args.grid, args.output_file,
+        args.processes, options))
@@ -8,6 +8,7 @@
 #  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
 
 import os
+from collections import namedtuple
 from string import Template
 from output.prettytable import PrettyTable
 
@@ -92,7 +93,7 @@ class TextTrace:
                 rs_table.add_row(row)
 
         # Table des registres
-        num_regs = int(len(simulator.regs) / 2)
+        num_regs = simulator.regs.num_registers
         reg_table = PrettyTable([' '] + [str(a) for a in range(10)])
         for reg_type in ['R', 'F']:
             for row_start in range(0, num_regs, 10):
@@ -204,7 +205,7 @@ class LaTeXTrace:
                 rs_table.add_row(row)
 
         # Table des registres
-        num_regs = int(len(simulator.regs) / 2)
+        num_regs = simulator.regs.num_registers
         reg_table = LaTeXTable('Registres', 'cycle%i_regs' % simulator.clock,
             [' '] + [str(a) for a in range(10)])
         for reg_type in ['R', 'F']:
@@ -240,3 +241,95 @@ class LaTeXTrace:
 
 
 
+
+
+#Vues d'une entrée du ROB et d'une station de réservation dans un `CycleSnapshot`.
+ROBView = namedtuple('ROBView', ['i', 'instr', 'state', 'dest', 'value', 'ready', 'funit',
+    'addr'])
+RSView = namedtuple('RSView', ['name', 'instr', 'busy', 'time', 'vj', 'vk', 'qj', 'qk', 'dest',
+    'A'])
+
+#Composantes pouvant être capturées par `CycleSnapshot`.
+snapshot_components = ['rob', 'rs', 'regs', 'mem']
+
+
+class CycleSnapshot(object):
+    '''
+    État du simulateur à la fin d'un coup d'horloge, retourné par `Simulator.iter_cycles`.
+
+    Seules les composantes de `components` (parmi `snapshot_components`) sont capturées, sous
+     forme de tuples bruts; les vues (`rob`, `rs`, `regs`, `stat`, `mem`) ne sont construites
+     qu'au premier accès. Les instructions (`instr`) sont partagées avec le simulateur et ne
+     doivent pas être modifiées.
+    '''
+    def __init__(self, simulator, components):
+        self.clock = simulator.clock
+        self.PC = simulator.PC
+        self.committed = simulator.committed
+        self.components = components
+        self._views = {}
+
+        if 'rob' in components:
+            self._rob = [(e.i, e.instr, e.state, e.dest, e.value, e.ready, e.funit, e.addr)
+                for e in simulator.ROB]
+        if 'rs' in components:
+            self._rs = [(f.name, f.instr, f.busy, f.time, f.vj, f.vk, f.qj, f.qk, f.dest, f.A)
+                for units in simulator.RS.values() for f in units]
+        if 'regs' in components:
+            self._reg_names = simulator.regs.keys()
+            self._regs = tuple(simulator.regs.values())
+            self._stat = tuple(simulator.regs.stat.values())
+        if 'mem' in components:
+            self._mem = list(simulator.mem.words())
+
+    def view(self, component, build):
+        if component not in self.components:
+            raise Exception('La composante %s n\'a pas été capturée (composantes: %s).' %
+                (component, ', '.join(self.components)))
+        if build not in self._views:
+            self._views[build] = build(self)
+        return self._views[build]
+
+    def build_rob(self):
+        return [ROBView(*e) for e in self._rob]
+
+    def build_rs(self):
+        return [RSView(*f) for f in self._rs]
+
+    def build_regs(self):
+        return dict(zip(self._reg_names, self._regs))
+
+    def build_stat(self):
+        return dict(zip(self._reg_names, self._stat))
+
+    def build_mem(self):
+        return self._mem
+
+    @property
+    def rob(self):
+        '''Entrées occupées du ROB, de la tête à la queue (liste de `ROBView`).'''
+        return self.view('rob', CycleSnapshot.build_rob)
+
+    @property
+    def rs(self):
+        '''Toutes les stations de réservation (liste de `RSView`).'''
+        return self.view('rs', CycleSnapshot.build_rs)
+
+    @property
+    def regs(self):
+        '''Valeurs des registres, {nom: valeur}.'''
+        return self.view('regs', CycleSnapshot.build_regs)
+
+    @property
+    def stat(self):
+        '''Renommage des registres, {nom: indice de l'entrée du ROB ou None}.'''
+        return self.view('regs', CycleSnapshot.build_stat)
+
+    @property
+    def mem(self):
+        '''Contenu de la mémoire (liste de mots).'''
+        return self.view('mem', CycleSnapshot.build_mem)
+
+    def __repr__(self):
+        return 'CycleSnapshot(clock=%i, PC=%i, components=%s)' % (self.clock, self.PC,
+            ','.join(self.components))
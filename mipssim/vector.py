@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2014, Julien-Charles Lévesque <levesque.jc@gmail.com>
+#  and contributors.
+#
+# Distributed under the terms of the MIT license. See the COPYING file at
+#  the top-level directory of this project and at
+#  https://bitbucket.org/ulaval-gif-3000/mipssim/raw/tip/COPYING
+
+'''
+Extension vectorielle du simulateur, activée par la présence d'unités `<Vector>` dans la
+ configuration (voir `components.VectorUnit`). Nécessite NumPy, mais seulement dans ce cas:
+ chaque vecteur est un tableau NumPy de flottants et chaque instruction vectorielle est
+ exécutée d'un bloc.
+
+Registres: `vector_registers` registres vectoriels (V0, V1, ...) d'au plus `vector_length`
+ éléments et le registre de longueur VL, initialisé à `vector_length` (voir `<Core>`).
+
+Instructions (les adresses sont en octets):
+
+    MTVL   R1           VL = R1 (exécutée par une unité ALU)
+    LV     V1,0(R1)     charge VL mots (flottants, comme L.D) consécutifs à partir de 0 + R1
+    LVWS   V1,0(R1),R2  charge VL mots espacés de R2 octets
+    SV     V1,0(R1)     écrit les éléments de V1 à partir de l'adresse 0 + R1
+    SVWS   V1,0(R1),R2  écrit les éléments de V1, espacés de R2 octets
+    ADDV   V1,V2,V3     V1 = V2 + V3 (aussi SUBV et MULV)
+    ADDVS  V1,V2,F0     V1 = V2 + F0 (aussi MULVS)
+    SUMV   F0,V1        F0 = somme des éléments de V1, dans l'ordre
+
+La longueur d'un vecteur est fixée par VL lors de son chargement; les opérations conservent la
+ longueur de leurs opérandes (la plus courte des deux). Comme les Stores, SV et SVWS n'écrivent
+ en mémoire qu'au sanctionnement; un LV ou un LVWS ne démarre qu'une fois sanctionnés les SV qui
+ le précèdent, ainsi que les Stores d'adresse inconnue ou identique à l'une des siennes. Avec une
+ hiérarchie de caches, chaque élément d'un accès vectoriel passe par le cache et le démarrage de
+ l'instruction est l'accès le plus lent (voir `Simulator.vector_latency`).
+'''
+
+import sys
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    #NumPy n'est requis que si des unités vectorielles sont configurées.
+    np = None
+
+#local imports
+import components
+
+#Instructions vectorielles accédant à la mémoire.
+VECTOR_LOADS = ('LV', 'LVWS')
+VECTOR_STORES = ('SV', 'SVWS')
+
+
+class VectorRegisters(components.Registers):
+    '''
+    Registres du MIPS simulé auxquels s'ajoutent les registres vectoriels V0, V1, ... et le
+     registre de longueur VL.
+    '''
+    def __init__(self, num_registers=components.NUM_REGISTERS, vector_registers=8,
+      vector_length=64):
+        if np is None:
+            raise Exception('Les unités vectorielles nécessitent NumPy.')
+        super(VectorRegisters, self).__init__(num_registers)
+        self.vector_registers = vector_registers
+        self.vector_length = vector_length
+        for i in range(vector_registers):
+            OrderedDict.__setitem__(self, 'V%i' % i, np.zeros(0))
+            self.stat['V%i' % i] = None
+        OrderedDict.__setitem__(self, 'VL', vector_length)
+        self.stat['VL'] = None
+
+    def check_vector_register(self, item):
+        if item != 'VL' and not (item[1:].isdigit() and
+          0 <= int(item[1:]) < self.vector_registers):
+            raise Exception('Accès à un registre non valide: %s.' % item)
+
+    def __deepcopy__(self, memo):
+        copy = VectorRegisters(self.num_registers, self.vector_registers, self.vector_length)
+        copy.restore(self.items())
+        copy.stat.update(self.stat)
+        copy.renamed = set(self.renamed)
+        return copy
+
+    def plain_items(self):
+        return [(k, v.tolist() if isinstance(v, np.ndarray) else v) for k, v in self.items()]
+
+    def fingerprint(self):
+        return tuple(v.tobytes() if isinstance(v, np.ndarray) else v for v in self.values())
+
+    def __getitem__(self, item):
+        if item[0] == 'V':
+            self.check_vector_register(item)
+            return OrderedDict.__getitem__(self, item)
+        return super(VectorRegisters, self).__getitem__(item)
+
+    def __setitem__(self, item, value, bypass=False):
+        if item[0] != 'V':
+            return super(VectorRegisters, self).__setitem__(item, value, bypass)
+        self.check_vector_register(item)
+        if item == 'VL':
+            value = check_length(value, self.vector_length)
+        else:
+            value = np.array(value, dtype=float).reshape(-1)
+            if len(value) > self.vector_length:
+                raise Exception('Vecteur trop long pour %s: %i éléments (maximum %i).' % (item,
+                    len(value), self.vector_length))
+        OrderedDict.__setitem__(self, item, value)
+
+
+def check_length(value, vector_length):
+    '''Vérifie qu'une longueur de vecteur (valeur de VL) est valide et la retourne.'''
+    try:
+        value = int(value)
+    except:
+        raise Exception('Valeur à assigner invalide: %s' % value)
+    if not 0 <= value <= vector_length:
+        raise components.ProgramError('Longueur de vecteur invalide: %i (maximum %i).' % (value,
+            vector_length))
+    return value
+
+
+def addresses(start, stride, n):
+    '''Adresses (en octets) des `n` éléments d'un accès à partir de `start`.'''
+    return range(start, start + n * stride, stride) if stride != 0 else [start] * n
+
+
+def operands(funit):
+    '''
+    Adresse de départ, espacement (en octets) et nombre d'éléments de l'accès mémoire de
+     l'instruction vectorielle de `funit`, dont les opérandes sont prêts.
+    '''
+    code = funit.instr.code
+    if code == 'LV':
+        return funit.A + funit.vj, 8, funit.vk
+    if code == 'LVWS':
+        return funit.A + funit.vj, funit.vk, funit.vs
+    if code == 'SV':
+        return funit.A + funit.vk, 8, len(funit.vj)
+    return funit.A + funit.vk, funit.vs, len(funit.vj)
+
+
+def element_count(funit):
+    '''Nombre d'éléments traités par l'instruction vectorielle de `funit`.'''
+    code = funit.instr.code
+    if code in VECTOR_LOADS or code in VECTOR_STORES:
+        return operands(funit)[2]
+    if isinstance(funit.vk, np.ndarray):
+        return min(len(funit.vj), len(funit.vk))
+    return len(funit.vj)
+
+
+def execute(funit, mem, vector_length):
+    '''
+    Exécute l'instruction vectorielle de `funit` et retourne son résultat: un vecteur, un
+     scalaire (SUMV) ou, pour SV et SVWS, un tuple (adresse, espacement, vecteur) à écrire en
+     mémoire au sanctionnement (voir `store`).
+    '''
+    code = funit.instr.code
+    if code in VECTOR_LOADS:
+        start, stride, n = operands(funit)
+        n = check_length(n, vector_length)
+        return np.fromiter((mem.load(a, 'float') for a in addresses(start, stride, n)), float,
+            n)
+    if code in VECTOR_STORES:
+        start, stride, _ = operands(funit)
+        return start, stride, funit.vj
+    if code == 'SUMV':
+        #Somme dans l'ordre des éléments, comme la boucle scalaire équivalente.
+        return float(np.cumsum(funit.vj)[-1]) if len(funit.vj) > 0 else 0.0
+
+    a = funit.vj
+    b = funit.vk
+    if isinstance(b, np.ndarray):
+        n = min(len(a), len(b))
+        a = a[:n]
+        b = b[:n]
+    if funit.instr.operator == '+':
+        return a + b
+    if funit.instr.operator == '-':
+        return a - b
+    if funit.instr.operator == '*':
+        return a * b
+    raise Exception('Instruction vectorielle inconnue (%s).' % code)
+
+
+def store(mem, value):
+    '''Écrit en mémoire le résultat `value` d'un SV ou d'un SVWS (voir `execute`).'''
+    start, stride, elements = value
+    for a, x in zip(addresses(start, stride, len(elements)), elements.tolist()):
+        mem[a] = x
+
+
+def load_conflicts(funit, rob, rob_e):
+    '''
+    Vrai si le LV ou le LVWS de `funit` (entrée `rob_e` du ROB) doit attendre un Store ou un
+     SV qui le précède dans `rob`.
+    '''
+    load_age = rob.age(rob_e.i)
+    touched = None
+    for i in rob.stores:
+        if rob.age(i) >= load_age:
+            break
+        e = rob[i]
+        if e.instr.funit_type != 'Store' or e.addr is None:
+            return True
+        if touched is None:
+            start, stride, n = operands(funit)
+            touched = set(addresses(start, stride, n))
+        if e.addr in touched:
+            return True
+    return False
+
+
+if __name__ == '__main__':
+    sys.stderr.write('Ce module n\'est pas utilisable seul.')
+    sys.exit(-1)